@@ -1,23 +1,35 @@
-import os
 import sys
+import time
 import pygame
 import argparse
-import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from pygame.locals import *
 from scripts.grouping_system import *
 from scripts.user_interface import *
 from scripts.game_objects import *
 from scripts.common_functions import *
+from scripts.quantum_engine import QuantumEngine
+from scripts.level import Level
+from scripts.game_state import GameState, move, apply_control_gate
+from scripts.level_pack import load_level_data, level_exists
+from scripts.snapshot import Snapshot
+from scripts.animation import Scheduler, Tween
+from scripts.evaluation import Evaluator, EVALUATION_EVENT
+from scripts.profiler import profiler, profiled
 
 
 # Constants
 FPS = 60
 HOP_FRAMES = 10
 HOP_DELAY_MS = 10
-SCREEN_BG_COLOR = (255, 255, 255)
 GAME_TITLE = 'Qungeon'
 DEFAULT_START_LEVEL = 1
+UNDO_LIMIT = 100
+OVERLAY_INTERVAL_MS = 250  # Time between updates of the frame time overlay
+OVERLAY_FONT_SIZE = 20
+DIRECTION_KEYS = {K_w: (0, -1), K_s: (0, 1), K_a: (-1, 0), K_d: (1, 0)}
 
 class GameHotbar(Hotbar):
     """Handles the game's hotbar interactions, primarily drag-and-drop functionality for items."""
@@ -32,77 +44,82 @@ class GameHotbar(Hotbar):
                 slot.dragging = False
                 self.remove_item(game, event, key)
 
-                slot.rect.x = self.rect.x + i * 55
+                slot.rect.x = self.rect.x + i * SLOT_SPACING
                 slot.rect.y = self.rect.y
                 break
 
-class Game:
-    """Main game class for Qungeon, managing levels, player movement, and the game loop.
-    Lower level working of class can be found in Engine class."""
+class Game(GameState):
+    """Main game class for Qungeon, managing levels, rendering, input and the game loop.
+    The rules of the game can be found in the GameState class, whose hooks are overridden
+    here to update the sprites, the hotbar, the background evaluations and the undo history."""
 
     def __init__(self, args):
         """Initializes the game, sets up the starting level, player, and game display."""
         pygame.init()
+        super().__init__(engine=QuantumEngine(sampling=args.sample, count=PEEK_COUNT))
         self.screen = pygame.display.set_mode((800, 600))
-        self.tiles = {}
-        self.objects = {}
-        self.effect_history = []
+        self.dragged_object = None
+        self.undo_stack = deque(maxlen=UNDO_LIMIT)
+        self.redo_stack = []
         
-        self.grouping_system = GroupingSystem()
-        self.quantum_grid = alpha.QuantumWorld()
+        self.evaluator = Evaluator(self.quantum_engine)
         self.object_sprites = pygame.sprite.Group()
         self.tile_sprites = pygame.sprite.Group()
         pygame.time.set_timer(pygame.USEREVENT, 1000) # Timer for running correlation_update()
 
         self.current_level = args.level
-        self.player = None
+        self.max_fps = args.fps
+        self.snapshot = None
+        self.next_level = None
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.background = None
+        self.full_redraw = True
+        self.drawn_sprites = {}
+        self.drawn_overlays = []
+        self.animations = Scheduler(HOP_DELAY_MS)
         self.hotbar = GameHotbar()
+        self.trace_file = args.trace
+        self.profile_image = None
+        self.profile_updated = 0
+        if args.profile or args.trace:
+            profiler.enable(overlay=args.profile)
         pygame.display.set_caption(GAME_TITLE)
-        self.load_level(f"./levels/{self.current_level}.json")
+        self.load_level(self.current_level)
     
-    def load_level(self, filename):
-        """Loads and parses the game level from a JSON file."""
-        with open(filename, "r") as file:
-            self.clean_up()
-
-            level_data = json.load(file)
-
-            for pos_str, tile_type_str in level_data["tiles"].items():
-                x, y = eval(pos_str)
-                tile_type = TileType[tile_type_str]
-                tile = Tile(x, y, tile_type)
-                self.tiles[(x, y)] = tile
-                self.tile_sprites.add(tile)
-
-                if tile_type == TileType.START:
-                    self.player = Player(x, y)
-
-            for position, item in level_data["objects"].items():
-                x, y = eval(position)
-  
-                new_obj = LootableObject(item, x, y)                    
-                self.objects[str(x) + "," + str(y)] = new_obj
-                self.object_sprites.add(new_obj)
-            
-            for position in level_data["quantum_objects"]:
-                x, y = eval(position)
-                new_obj = QuantumObject(x, y, self)
-                self.objects[str(x) + "," + str(y)] = new_obj
-                self.object_sprites.add(new_obj)
-
-            for gate, count in level_data["gates"].items():
-                self.hotbar.add_item(gate, count)
-
-            for effect_entry in level_data["effects"]:
-                x, y = eval(effect_entry["position"])
-                effect = getattr(alpha, effect_entry["effect"])()
-
-                if "target" in effect_entry:
-                    target_x, target_y = eval(effect_entry["target"])
-                    effect = [effect, [target_x, target_y]]
-
-                self.objects[str(x) + "," + str(y)].apply_effect(self, effect)
-                
+    def load_level(self, number):
+        """Loads the game level with the given number, from the level pack or its JSON file."""
+        self.enter_level(self.build_level(number))
+
+    def enter_level(self, level):
+        """Makes a loaded level the current one and starts preparing the level after it."""
+        self.clean_up()
+        self.tiles = level.tiles
+        self.tile_sprites = level.tile_sprites
+        self.objects = level.objects
+        self.object_sprites = level.object_sprites
+        self.player = level.player
+        self.grouping_system = level.grouping_system
+        self.quantum_engine.backend = level.quantum_engine.backend
+        self.completed = False
+        for gate, count in level.inventory.items():
+            self.hotbar.add_item(gate, count)
+
+        self.background = level.background
+        self.full_redraw = True
+        self.snapshot = Snapshot(self)
+        self.prefetch_level()
+
+    def prefetch_level(self):
+        """Starts loading the next level on a background thread, so advancing to it is instant."""
+        self.next_level = None
+        if level_exists(self.current_level + 1):
+            self.next_level = self.prefetcher.submit(self.build_level, self.current_level + 1)
+
+    @profiled('level')
+    def build_level(self, number):
+        """Loads and builds the level with the given number without entering it."""
+        return Level(load_level_data(number), self.quantum_engine, self.screen.get_size())
+
     def clean_up(self):
         """Resets and clears all game objects, tiles, and hotbar slots when loading a new level."""
         self.tiles.clear()
@@ -111,169 +128,267 @@ class Game:
         self.object_sprites.empty()
         self.hotbar.slots.clear()
         self.hotbar.sprites.empty()
-        self.quantum_grid.clear()
-
-    def hop_animation(self, start_pos, end_pos):
-        """Animates the player's movement with a hopping effect."""
-        for i in range(HOP_FRAMES):
-            progress = (i + 1) / HOP_FRAMES
+        self.grouping_system.groups.clear()
+        self.evaluator.cancel()
+        self.dragged_object = None
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.animations.clear()
+
+    def items(self):
+        """Returns every item the hotbar holds."""
+        return list(self.hotbar.slots)
+
+    def item_count(self, item):
+        """Returns how many of an item the hotbar holds."""
+        slot = self.hotbar.slots.get(item)
+        return slot.count if slot else 0
+
+    def add_item(self, item, count):
+        """Adds a number of an item to the hotbar."""
+        self.hotbar.add_item(item, count)
+
+    def use_item(self, item):
+        """Removes one of an item from the hotbar."""
+        self.hotbar.remove_by_key(item)
+
+    def evaluate(self, groups):
+        """Starts evaluating the given groups on the background thread."""
+        self.evaluator.submit(groups)
+
+    def checkpoint(self):
+        """Returns a snapshot of the current state."""
+        return Snapshot(self)
+
+    def save_checkpoint(self, checkpoint=None):
+        """Saves a checkpoint of the current state, or the given one, before a move so it can be undone."""
+        self.undo_stack.append(checkpoint or Snapshot(self))
+        self.redo_stack.clear()
+
+    def undo(self):
+        """Restores the state from before the last move."""
+        self.animations.finish()
+        if self.undo_stack:
+            self.redo_stack.append(Snapshot(self))
+            self.undo_stack.pop().restore(self)
+
+    def redo(self):
+        """Restores the state from before the last undo."""
+        self.animations.finish()
+        if self.redo_stack:
+            self.undo_stack.append(Snapshot(self))
+            self.redo_stack.pop().restore(self)
+
+    def hop_animation(self, start_pos, end_pos, finish=None):
+        """Starts animating the player's movement with a hopping effect. The player's position is not changed."""
+        def hop(progress):
             hop_height = -(progress * (1 - progress))
             new_x = start_pos[0] + (end_pos[0] - start_pos[0]) * progress
             new_y = start_pos[1] + (end_pos[1] - start_pos[1]) * progress + hop_height
+            self.player.move_image(new_x, new_y)
 
-            self.player.update_position(new_x, new_y)
-            self.display_game()
-            pygame.time.delay(HOP_DELAY_MS)
+        self.player.move_image(*start_pos)
+        self.animations.add('player', Tween(HOP_FRAMES, hop, finish))
 
     def update_position(self, direction):
-        """Updates the player's position based on the input direction key and handles level progression."""
-        x, y = self.player.position
-        new_x, new_y = x, y
-
-        if direction == K_w:
-            new_y -= 1
-        elif direction == K_s:
-            new_y += 1
-        elif direction == K_a:
-            new_x -= 1
-        elif direction == K_d:
-            new_x += 1
-
-        start_pos = (x, y)
-        end_pos = (new_x, new_y)
-
-        # Check tile and object interactions
-        tile = self.tiles.get((new_x, new_y))
-        object_key = str(new_x) + "," + str(new_y)
-
-        if tile and tile.type == TileType.END:
-            self.hop_animation(start_pos, end_pos)
-            self.advance_level()
-        elif object_key in self.objects:
-            if self.objects[object_key].function(self, new_x, new_y):
-                self.hop_animation(start_pos, end_pos)
-                self.player.update_position(new_x, new_y)
-        elif tile and tile.type != TileType.WALL:
-            self.hop_animation(start_pos, end_pos)
-            self.player.update_position(new_x, new_y)
+        """Moves the player in the direction of the input key with a hop, and advances to the next level at the end tile."""
+        self.animations.finish('player')
+        start_pos = self.player.position
+        if self.step(move(DIRECTION_KEYS[direction])):
+            self.hop_animation(start_pos, self.player.position, self.advance_level if self.completed else None)
 
     def advance_level(self):
         """Advances to the next level, or ends the game if no further levels exist."""
         self.current_level += 1
-        next_level_filename = f"./levels/{self.current_level}.json"
-        if os.path.isfile(next_level_filename):
-            self.load_level(next_level_filename)
+        if self.next_level:
+            self.enter_level(self.next_level.result())
         else:
             print("Game completed!")
-            pygame.quit()
-            sys.exit()
+            self.quit()
     
     #Below functions rea for rendering of the game.
+    @profiled('render')
     def display_game(self):
-        """Renders the current game state, including the player, tiles, and hotbar, to the screen."""
-        self.screen.fill(SCREEN_BG_COLOR)
-        
-        self.tile_sprites.draw(self.screen)
-
+        """Renders the current game state on top of the cached background.
+        Only the regions where a sprite or overlay changed since the last frame are redrawn and updated."""
         all_sprites = list(self.object_sprites)
         all_sprites.append(self.player)
         all_sprites.sort(key=lambda sprite: (sprite.rect.y, 0 if sprite == self.player else 1))
+        all_sprites.extend(self.hotbar.sprites)
 
-        for sprite in all_sprites:
-            self.screen.blit(sprite.image, sprite.rect)
-
-        self.hotbar.sprites.draw(self.screen)
-        self.entanglement_visuals()
-        hover(self.hotbar.slots, self.screen)
+        drawn_sprites = {sprite: (sprite.image, sprite.rect.copy()) for sprite in all_sprites}
+        overlays = self.entanglement_visuals() + self.hotbar.hover() + self.profile_overlay()
 
-        pygame.display.update()
+        if self.full_redraw:
+            dirty_rects = [self.screen.get_rect()]
+            self.full_redraw = False
+        else:
+            dirty_rects = []
+            for sprite in set(drawn_sprites) | set(self.drawn_sprites):
+                drawn = drawn_sprites.get(sprite)
+                previous = self.drawn_sprites.get(sprite)
+                if drawn != previous:
+                    dirty_rects.extend(state[1] for state in (drawn, previous) if state)
+            if overlays != self.drawn_overlays:
+                dirty_rects.extend(overlay_rect(overlay) for overlay in overlays + self.drawn_overlays)
+
+        self.drawn_sprites = drawn_sprites
+        self.drawn_overlays = overlays
+        dirty_rects = merge_rects(dirty_rects)
+
+        for rect in dirty_rects:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, rect)
+            for sprite in all_sprites:
+                if sprite.rect.colliderect(rect):
+                    self.screen.blit(sprite.image, sprite.rect)
+            for overlay in overlays:
+                if overlay_rect(overlay).colliderect(rect):
+                    draw_overlay(self.screen, overlay)
+        self.screen.set_clip(None)
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def profile_overlay(self):
+        """Returns the overlay showing the time spent on recent frames, if profiling with an overlay. It is refreshed a few times per second."""
+        if not profiler.overlay:
+            return []
+
+        now = pygame.time.get_ticks()
+        if self.profile_image is None or now - self.profile_updated >= OVERLAY_INTERVAL_MS:
+            mean_ms, max_ms = profiler.frame_stats()
+            text = render_text(f"frame {mean_ms:.1f} ms avg, {max_ms:.1f} ms max", OVERLAY_FONT_SIZE)
+            self.profile_image = pygame.Surface(text.get_rect().inflate(8, 6).size)
+            self.profile_image.fill((25, 25, 25))
+            self.profile_image.blit(text, (4, 3))
+            self.profile_updated = now
+        return [('image', self.profile_image, self.profile_image.get_rect(topleft=(4, 4)))]
+
+    def object_at(self, pixel_position):
+        """Returns the object shown at a pixel position, looked up from the tile containing it."""
+        obj = self.objects.get(grid_position(pixel_position))
+        if obj and obj.rect.collidepoint(pixel_position):
+            return obj
 
     def handle_object_dragging(self, event):
         """Handles the dragging of objects based on mouse events."""
-        for name, obj in self.objects.items():
-            if obj.dragging:
-                obj.dragging = False
-
-                obj.rect.x = obj.origin_x
-                obj.rect.y = obj.origin_y
+        obj = self.dragged_object
+        if obj:
+            self.dragged_object = None
+            obj.dragging = False
 
-                for name, other_obj in self.objects.items():
-                    if other_obj.rect.collidepoint(event.pos):
-                        if obj == other_obj:
-                            pass
-                        elif isinstance(obj, QuantumObject) and isinstance(other_obj, QuantumObject):
-                            if obj.control == 'CNOT':
-                                obj.apply_effect(self, [alpha.Flip(), other_obj.position])
-                            elif obj.control == 'CHAD':
-                                obj.apply_effect(self, [alpha.Superposition(), other_obj.position])
+            obj.rect.x = obj.origin_x
+            obj.rect.y = obj.origin_y
 
-                            return obj.control
+            other_obj = self.object_at(event.pos)
+            if other_obj:
+                return self.step(apply_control_gate(obj.control, obj.position, other_obj.position))
 
-                return False
+            return False
 
+    @profiled('render')
     def correlation_update(self):
         """Updates the visual representation of object correlations based on their grouping."""
         groups = self.grouping_system.groups
         for group in groups:
-            if len(group.states) > 1:
-                state = list(group.states.keys())[self.grouping_system.count % len(group.states)]
-                for key, object in enumerate(group.objects):
-                    object.change_color(pillar_image, object.color, (state[key] + 1) * 127)
+            frame = group.frame(self.grouping_system.count)
+            if frame:
+                for object, image in zip(group.objects, frame):
+                    object.image = image
 
         self.grouping_system.count += 1
     
     def entanglement_visuals(self):
-        """Draws visual lines between entangled objects to represent their connections."""
+        """Returns visual lines between entangled objects to represent their connections, for the object under the mouse."""
+        lines = []
         mouse_pos = pygame.mouse.get_pos()
-        for name, object in self.objects.items():
+        hovered_objects = [self.object_at(mouse_pos)]
+        if self.dragged_object and self.dragged_object.rect.collidepoint(mouse_pos):
+            hovered_objects.append(self.dragged_object)
+
+        for object in hovered_objects:
             if isinstance(object, QuantumObject):
-                if object.rect.collidepoint(mouse_pos):
-                    for entangled_object in object.group.objects:
-                        if object != entangled_object:
-                            start_pos = ((object.position[0] + 0.5) * BLOCK_SIZE, (object.position[1] + 0.5) * BLOCK_SIZE)
-                            end_pos = ((entangled_object.position[0] + 0.5) * BLOCK_SIZE, (entangled_object.position[1] + 0.5) * BLOCK_SIZE)
-                            pygame.draw.line(self.screen, (255, 255, 255), start_pos, end_pos, width=2)
+                for entangled_object in object.group.objects:
+                    if object != entangled_object:
+                        start_pos = ((object.position[0] + 0.5) * BLOCK_SIZE, (object.position[1] + 0.5) * BLOCK_SIZE)
+                        end_pos = ((entangled_object.position[0] + 0.5) * BLOCK_SIZE, (entangled_object.position[1] + 0.5) * BLOCK_SIZE)
+                        lines.append(('line', start_pos, end_pos))
+        return lines
+
+    def quit(self):
+        """Writes the recorded trace, if asked for, and closes the game."""
+        if self.trace_file:
+            profiler.export(self.trace_file)
+            print(f"Trace written to {self.trace_file}")
+        pygame.quit()
+        sys.exit()
 
     # Below functions are for the main game loop.
     def run(self):
-        """Main game loop that handles events, updates, and rendering."""
+        """Main game loop that handles events, updates, and rendering.
+        While no animation is running the loop sleeps until the next event, such as input or the
+        correlation timer, instead of rendering at a fixed rate. Frames never exceed the frame cap."""
         clock = pygame.time.Clock()
-    
+        elapsed_ms = 0
+
         while True:
+            event = None if self.animations.busy() else pygame.event.wait()
+            frame_start = time.perf_counter()
+            if event is not None:
+                self.handle_event(event)
+                clock.tick()
+                elapsed_ms = 0
             self.handle_events()
-            update_mouse_drag(self.hotbar.slots)
-            update_mouse_drag(self.objects)
+            update_mouse_drag(self.hotbar.slots.values())
+            if self.dragged_object:
+                update_mouse_drag([self.dragged_object])
+            self.animations.update(elapsed_ms)
             self.display_game()
-            clock.tick(FPS)
+            if profiler.enabled:
+                frame_end = time.perf_counter()
+                profiler.record('frame', 'frame', frame_start, frame_end)
+                profiler.add_frame((frame_end - frame_start) * 1000)
+            elapsed_ms = clock.tick(self.max_fps)
 
     def handle_events(self):
-        """Handles all game events such as keyboard input, mouse actions, and custom events."""
+        """Handles all pending game events."""
         for event in pygame.event.get():
-            if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
-            elif event.type == KEYDOWN:
-                self.handle_keydown(event)
-            elif event.type == pygame.USEREVENT:
-                self.correlation_update()
-            elif event.type == MOUSEBUTTONDOWN and event.button == 1:
-                obj_effect = self.handle_object_dragging(event)
-                if obj_effect:
-                    self.hotbar.remove_by_key(obj_effect)
-                else:
-                    handle_slot_mouse_down(self.hotbar.slots, event)
-            elif event.type == MOUSEBUTTONUP and event.button == 1:
-                self.hotbar.handle_mouse_up(self, event)
+            self.handle_event(event)
+
+    @profiled('events')
+    def handle_event(self, event):
+        """Handles a game event such as keyboard input, mouse actions, and custom events."""
+        if event.type == QUIT:
+            self.quit()
+        elif event.type == KEYDOWN:
+            self.handle_keydown(event)
+        elif event.type == VIDEOEXPOSE:
+            self.full_redraw = True
+        elif event.type == pygame.USEREVENT:
+            self.correlation_update()
+        elif event.type == EVALUATION_EVENT:
+            self.evaluator.update()
+        elif event.type == MOUSEBUTTONDOWN and event.button == 1:
+            if not self.handle_object_dragging(event):
+                self.hotbar.handle_mouse_down(event)
+        elif event.type == MOUSEBUTTONUP and event.button == 1:
+            self.hotbar.handle_mouse_up(self, event)
 
     def handle_keydown(self, event):
         """Handles keydown events for movement and other actions."""
         if event.key == K_q:
-            pygame.quit()
-            sys.exit()
-        elif event.key in [K_w, K_s, K_a, K_d]:
+            self.quit()
+        elif event.key in DIRECTION_KEYS:
             self.update_position(event.key)
         elif event.key == K_r:
-            self.load_level(f"./levels/{self.current_level}.txt")
+            self.animations.finish()
+            self.save_checkpoint()
+            self.snapshot.restore(self)
+        elif event.key == K_z:
+            self.undo()
+        elif event.key == K_y:
+            self.redo()
         elif event.key == K_i:
             self.import_level()
 
@@ -281,6 +396,10 @@ class Game:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Optional setting for starting level.")
     parser.add_argument('level', nargs='?', type=int, default=DEFAULT_START_LEVEL, help='The starting level of the game (default is 1)')
+    parser.add_argument('--sample', action='store_true', help='Estimate pillar states from measurement samples instead of the exact state vector')
+    parser.add_argument('--fps', type=int, default=FPS, help=f'The maximum number of frames rendered per second (default is {FPS})')
+    parser.add_argument('--profile', action='store_true', help='Show the time spent on recent frames on screen')
+    parser.add_argument('--trace', help='Record event handling, quantum evaluation and rendering, and write them to this file as a Chrome trace on exit')
     args = parser.parse_args()
 
     game_instance = Game(args)
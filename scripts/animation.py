@@ -0,0 +1,69 @@
+class Tween:
+    """Animates something over a fixed number of steps by calling an update function with the progress of each step."""
+    def __init__(self, steps, update, finish=None):
+        """Initializes the tween with its number of steps, update function and optional function called at the end."""
+        self.steps = steps
+        self.update = update
+        self.finish = finish
+        self.step_count = 0
+
+    def step(self):
+        """Advances the tween by one step. Returns True once it has reached the end."""
+        self.step_count += 1
+        self.update(min(self.step_count / self.steps, 1.0))
+        return self.step_count >= self.steps
+
+    def complete(self):
+        """Jumps to the end of the tween and calls its finish function."""
+        self.step_count = self.steps
+        self.update(1.0)
+        if self.finish:
+            self.finish()
+
+class Scheduler:
+    """Advances running tweens with a fixed timestep, so animations are independent of the frame rate
+    and run alongside the game loop instead of blocking it. Every tween runs under a key, and starting
+    a tween under a key that is still animating completes the old one first."""
+    def __init__(self, timestep_ms, max_steps=5):
+        """Initializes the scheduler with its timestep and the most steps it catches up on per update."""
+        self.timestep_ms = timestep_ms
+        self.max_steps = max_steps
+        self.accumulator = 0
+        self.tweens = {}
+
+    def add(self, key, tween):
+        """Starts a tween under a key."""
+        self.finish(key)
+        self.tweens[key] = tween
+
+    def finish(self, key=None):
+        """Completes the tween under a key, or every running tween when no key is given."""
+        keys = list(self.tweens) if key is None else [key]
+        for key in keys:
+            tween = self.tweens.pop(key, None)
+            if tween:
+                tween.complete()
+
+    def clear(self):
+        """Stops every running tween without completing it."""
+        self.tweens.clear()
+        self.accumulator = 0
+
+    def busy(self):
+        """Checks if any tween is running."""
+        return bool(self.tweens)
+
+    def update(self, elapsed_ms):
+        """Advances every running tween by the number of whole timesteps that have elapsed."""
+        if not self.tweens:
+            self.accumulator = 0
+            return
+
+        self.accumulator = min(self.accumulator + elapsed_ms, self.timestep_ms * self.max_steps)
+        while self.accumulator >= self.timestep_ms and self.tweens:
+            self.accumulator -= self.timestep_ms
+            for key, tween in list(self.tweens.items()):
+                if self.tweens.get(key) is tween and tween.step():
+                    del self.tweens[key]
+                    if tween.finish:
+                        tween.finish()
@@ -0,0 +1,36 @@
+import pygame
+import threading
+
+ASSET_DIRECTORY = './assets'
+
+class AssetManager:
+    """Loads every image from the asset directory once, on first use, and shares scaled versions of it.
+    Shared images must never be drawn on."""
+    def __init__(self, directory=ASSET_DIRECTORY):
+        """Initializes the manager with empty image caches."""
+        self.directory = directory
+        self.images = {}
+        self.scaled_images = {}
+        self.lock = threading.RLock()
+
+    def image(self, name):
+        """Returns the image with the given name, loading it on first use."""
+        with self.lock:
+            if name not in self.images:
+                image = pygame.image.load(f'{self.directory}/{name}.png')
+                if pygame.display.get_surface():
+                    image = image.convert_alpha()
+                self.images[name] = image
+            return self.images[name]
+
+    def scaled(self, name, factor):
+        """Returns the image with the given name scaled by a factor, scaling it on first use."""
+        key = (name, factor)
+        with self.lock:
+            if key not in self.scaled_images:
+                image = self.image(name)
+                rect = image.get_rect()
+                self.scaled_images[key] = pygame.transform.scale(image, (int(rect.width * factor), int(rect.height * factor)))
+            return self.scaled_images[key]
+
+assets = AssetManager()
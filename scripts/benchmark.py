@@ -0,0 +1,192 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Renders without a display, before pygame is imported
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+import pygame
+from collections import defaultdict
+from contextlib import contextmanager
+from Qungeon import Game, FPS, DIRECTION_KEYS
+from scripts.level import Level
+from scripts.level_pack import LevelData
+from scripts.game_state import Action, move, apply_gate, apply_control_gate
+
+FRAME_MS = 1000 / FPS
+CORRELATION_UPDATES = 20  # Correlation frames rendered after every replay
+SYNTHETIC_SIZES = [8, 24]  # Columns of pillar pairs in the synthetic levels
+PERCENTILES = [50, 90, 99]
+
+UP, DOWN, LEFT, RIGHT = (move(direction) for direction in [(0, -1), (0, 1), (-1, 0), (1, 0)])
+
+# Shortest solutions of the shipped levels, as found by the solver
+REPLAYS = {
+    1: [RIGHT, apply_gate('X', (5, 4)), RIGHT, RIGHT],
+    2: [RIGHT, apply_gate('H', (5, 4)), RIGHT, apply_gate('X', (6, 4)), RIGHT, RIGHT],
+    3: [RIGHT, apply_gate('H', (5, 4)), apply_gate('X', (5, 4)), RIGHT, RIGHT, RIGHT],
+    4: [RIGHT, apply_gate('H', (5, 4)), apply_gate('Z', (5, 4)), apply_gate('H', (5, 4)), RIGHT, RIGHT, RIGHT],
+    5: [RIGHT, apply_gate('X', (6, 3)), RIGHT, DOWN, apply_gate('H', (6, 5)), DOWN, RIGHT, LEFT, UP, UP, RIGHT, RIGHT,
+        apply_gate('Z', (9, 3)), apply_gate('H', (9, 3)), RIGHT, DOWN],
+    6: [apply_gate('H', (4, 5)), DOWN, DOWN, UP, RIGHT, apply_gate('H', (6, 5)), RIGHT, DOWN, apply_gate('X', (6, 7)), DOWN,
+        LEFT, RIGHT, RIGHT, apply_gate('X', (8, 7)), RIGHT, RIGHT],
+    7: [RIGHT, apply_control_gate('CNOT', (6, 5), (7, 4)), RIGHT, DOWN, RIGHT],
+    8: [apply_control_gate('CNOT', (4, 3), (5, 3)), apply_control_gate('CNOT', (4, 3), (6, 3)), apply_gate('H', (4, 3)),
+        RIGHT, RIGHT, RIGHT, RIGHT]
+}
+
+def synthetic_level(columns):
+    """Returns a level with a corridor between two rows of pillars, and a replay that walks along it and applies
+    gates to every pillar, entangling each pair above and below the corridor. Every fourth pair gets a
+    non-Clifford gate, so the level runs on amplitudes instead of a stabilizer tableau."""
+    end_x = columns + 2
+    tiles = [(1, 4, 'START'), (end_x, 4, 'END')]
+    tiles += [(x, y, 'EMPTY') for x in range(2, end_x) for y in (3, 4, 5)]
+    tiles += [(x, y, 'WALL') for x in range(1, end_x + 1) for y in (2, 6)]
+    quantum_objects = [(x, y) for x in range(2, end_x) for y in (3, 5)]
+    effects = [(x, 5, 'Flip', None) for x in range(2, end_x)]
+    rotations = list(range(2, end_x, 4))
+    gates = {'H': columns, 'CNOT': columns, 'X': columns, 'RotY': len(rotations)}
+
+    replay = [RIGHT]
+    for x in range(2, end_x):
+        replay += [apply_gate('H', (x, 3)), apply_control_gate('CNOT', (x, 3), (x, 5)), apply_gate('X', (x, 5))]
+        if x in rotations:
+            replay.append(apply_gate('RotY', (x, 3)))
+        replay.append(RIGHT)
+    return LevelData(tiles, [], quantum_objects, gates, effects), replay
+
+class BenchmarkGame(Game):
+    """The game, with reaching the end tile recorded instead of advancing to the next level."""
+    def advance_level(self):
+        """Records that the level was completed."""
+        self.completed_levels += 1
+
+class Recorder:
+    """Collects the duration of every measured operation."""
+    def __init__(self):
+        """Initializes the recorder without any measurements."""
+        self.durations = defaultdict(list)
+
+    @contextmanager
+    def measure(self, operation):
+        """Measures the duration of the code run inside the context as one call of an operation."""
+        start = time.perf_counter()
+        yield
+        self.durations[operation].append((time.perf_counter() - start) * 1000)
+
+    def summary(self):
+        """Returns the count, mean, percentiles and maximum of the durations of every operation, in milliseconds."""
+        summary = {}
+        for operation, durations in sorted(self.durations.items()):
+            stats = {'count': len(durations), 'mean_ms': float(np.mean(durations))}
+            stats.update({f'p{percentile}_ms': float(np.percentile(durations, percentile)) for percentile in PERCENTILES})
+            stats['max_ms'] = float(np.max(durations))
+            summary[operation] = stats
+        return summary
+
+class Benchmark:
+    """Replays scripted actions on levels through the pygame frontend and measures loading, quantum evaluation,
+    correlation updates and rendering. Timings are taken first, and peak memory in a separate run,
+    since tracing allocations slows everything down."""
+
+    def __init__(self, repeat=3):
+        """Initializes the benchmark with the number of timed runs per level and a game to run them in."""
+        self.repeat = repeat
+        self.game = BenchmarkGame(argparse.Namespace(level=1, sample=False, fps=FPS, profile=False, trace=None))
+        self.game.completed_levels = 0
+        self.wait_for_prefetch()
+
+    def wait_for_prefetch(self):
+        """Waits until the next level is prepared in the background, so it does not compete with the measurements."""
+        if self.game.next_level:
+            self.game.next_level.result()
+
+    def load(self, level, recorder):
+        """Loads a level number or level data into the game."""
+        with recorder.measure('load_level'):
+            if isinstance(level, LevelData):
+                self.game.enter_level(Level(level, self.game.quantum_engine, self.game.screen.get_size()))
+            else:
+                self.game.load_level(level)
+        self.wait_for_prefetch()
+
+    def render(self, recorder):
+        """Renders frames until no animation is running, like the game loop does."""
+        while True:
+            with recorder.measure('frame'):
+                self.game.handle_events()
+                self.game.animations.update(FRAME_MS)
+                with recorder.measure('display_game'):
+                    self.game.display_game()
+            if not self.game.animations.busy():
+                break
+
+    def run(self, level, replay, recorder):
+        """Loads a level, takes every action of the replay and renders the result. Returns if the level was completed."""
+        completed_levels = self.game.completed_levels
+        self.load(level, recorder)
+        self.render(recorder)
+
+        keys = {direction: key for key, direction in DIRECTION_KEYS.items()}
+        for action in replay:
+            if action[0] == Action.MOVE:
+                with recorder.measure('move'):
+                    self.game.update_position(keys[action[1]])
+            else:
+                with recorder.measure('apply_effect'):
+                    self.game.step(action)
+                    self.game.evaluator.wait()
+            self.render(recorder)
+
+        for _ in range(CORRELATION_UPDATES):
+            with recorder.measure('correlation_update'):
+                self.game.correlation_update()
+            self.render(recorder)
+        return self.game.completed_levels > completed_levels
+
+    def measure(self, level, replay):
+        """Returns the timings, completion and peak memory of replaying a level."""
+        recorder = Recorder()
+        completed = all([self.run(level, replay, recorder) for _ in range(self.repeat)])
+
+        tracemalloc.start()
+        self.run(level, replay, Recorder())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        summary = recorder.summary()
+        return {'actions': len(replay), 'completed': completed, 'peak_memory_bytes': peak,
+                'frames': summary.pop('frame'), 'operations': summary}
+
+def environment():
+    """Returns the versions and settings the benchmark ran with."""
+    return {'python': platform.python_version(), 'pygame': pygame.version.ver, 'numpy': np.__version__,
+            'platform': platform.platform(), 'video_driver': os.environ['SDL_VIDEODRIVER']}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays scripted actions on levels and reports latencies, frame times and peak memory as JSON.")
+    parser.add_argument('levels', nargs='*', type=int, help='The shipped levels to replay (default is every level with a replay)')
+    parser.add_argument('--synthetic', nargs='*', type=int, default=SYNTHETIC_SIZES, help=f'Columns of pillar pairs of the synthetic levels (default is {SYNTHETIC_SIZES})')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of timed runs per level (default is 3)')
+    parser.add_argument('--output', help='The file the results are written to (default is standard output)')
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.repeat)
+    results = {}
+    for level in args.levels or list(REPLAYS):
+        results[str(level)] = benchmark.measure(level, REPLAYS[level])
+    for columns in args.synthetic:
+        results[f'synthetic-{columns}'] = benchmark.measure(*synthetic_level(columns))
+
+    report = json.dumps({'environment': environment(), 'repeat': args.repeat, 'levels': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report + '\n')
+    else:
+        print(report)
+    pygame.quit()
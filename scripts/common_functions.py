@@ -1,16 +1,47 @@
 import pygame
+import threading
+from collections import OrderedDict
 
-def add_text(sprite, text, x=0, y=0):
+LINE_WIDTH = 2
+FONT_SIZE = 24
+TEXT_COLOR = (255, 255, 255)
+TEXT_CACHE_SIZE = 128
+
+fonts = {}
+text_cache = OrderedDict()
+text_lock = threading.RLock()
+
+def get_font(size=FONT_SIZE):
+    """Returns the default font in the given size, created once per size."""
+    with text_lock:
+        if size not in fonts:
+            fonts[size] = pygame.font.Font(None, size)
+        return fonts[size]
+
+def render_text(text, size=FONT_SIZE, color=TEXT_COLOR):
+    """Returns the rendered text with a transparent background. Recently used texts are kept in a bounded cache."""
+    key = (text, size, color)
+    with text_lock:
+        if key in text_cache:
+            text_cache.move_to_end(key)
+            return text_cache[key]
+
+        text_surface = get_font(size).render(text, True, color)
+        text_surface.set_colorkey((0, 0, 0))  # Set black as transparent
+        text_cache[key] = text_surface
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
+        return text_surface
+
+def add_text(sprite, text, x=0, y=0, size=FONT_SIZE, color=TEXT_COLOR):
     """Adds text to the sprite's image at the specified position."""
-    font = pygame.font.Font(None, 24)
-    text_surface = font.render(text, True, (255, 255, 255))
-    text_surface.set_colorkey((0, 0, 0))  # Set black as transparent
+    text_surface = render_text(text, size, color)
     sprite.image = sprite.image.convert_alpha()
     sprite.image.blit(text_surface, (x, y))
 
 def update_mouse_drag(elements):
     """Updates the position of elements being dragged by the mouse."""
-    for key, element in elements.items():
+    for element in elements:
         if element.dragging:
             mouse_x, mouse_y = pygame.mouse.get_pos()
             element.rect.x = mouse_x - element.offset_x
@@ -26,17 +57,28 @@ def set_dragging(element, event):
     element.offset_x = event.pos[0] - element.rect.x
     element.offset_y = event.pos[1] - element.rect.y
 
-def handle_slot_mouse_down(elements, event):
-    """Checks if an element was clicked and sets it to be dragged."""
-    for key, element in elements.items():
-        if element.rect.collidepoint(event.pos):
-            set_dragging(element, event)
-            return True
-    return False
-
-def hover(elements, screen):
-    """Highlights elements under the mouse cursor."""
-    mouse_pos = pygame.mouse.get_pos()
-    for key, element in elements.items():
-        if element.rect.collidepoint(mouse_pos):
-            element.hover(screen)
+def overlay_rect(overlay):
+    """Returns the screen area covered by an overlay, which is either an image or a line."""
+    if overlay[0] == 'image':
+        return overlay[2]
+    (start_x, start_y), (end_x, end_y) = overlay[1], overlay[2]
+    rect = pygame.Rect(min(start_x, end_x), min(start_y, end_y), abs(end_x - start_x) + 1, abs(end_y - start_y) + 1)
+    return rect.inflate(LINE_WIDTH * 2, LINE_WIDTH * 2)
+
+def draw_overlay(screen, overlay):
+    """Draws an image or line overlay on the screen."""
+    if overlay[0] == 'image':
+        screen.blit(overlay[1], overlay[2])
+    else:
+        pygame.draw.line(screen, (255, 255, 255), overlay[1], overlay[2], width=LINE_WIDTH)
+
+def merge_rects(rects):
+    """Merges overlapping rectangles, so every region of the screen is redrawn only once."""
+    merged = []
+    for rect in rects:
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect = rect.union(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
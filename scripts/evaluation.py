@@ -0,0 +1,79 @@
+import pygame
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scripts.profiler import profiled
+
+EVALUATION_EVENT = pygame.USEREVENT + 1  # Posted whenever a background evaluation finishes
+
+@profiled('quantum')
+def evaluate(engine, simulation, objects):
+    """Reads the correlated states of a group's objects in order, and the state and phase of each of them, from a simulation.
+    Everything a group needs is prepared here, so applying the result on the main thread only swaps references."""
+    states = OrderedDict(sorted(engine.get_correlated_histogram(objects, simulation).items()))
+    probabilities = engine.get_probabilities(objects, simulation)
+    phases = [engine.get_phase(obj, simulation) for obj in objects]
+    return states, list(states), list(zip(objects, probabilities, phases))
+
+def notify(future):
+    """Wakes up the game loop when an evaluation finishes."""
+    if not future.cancelled() and pygame.display.get_init():
+        pygame.event.post(pygame.event.Event(EVALUATION_EVENT))
+
+class Evaluator:
+    """Evaluates the states of groups on a background thread, so expensive simulations do not stall the game loop.
+    An evaluation reads a simulation that is marked as shared, so effects applied in the meantime change a copy.
+    Results are applied on the main thread once they arrive, and a newer evaluation of a group replaces an older one."""
+    def __init__(self, engine):
+        """Initializes the evaluator with the quantum engine and a single worker thread."""
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.jobs = {}
+
+    def submit(self, groups):
+        """Starts evaluating the given groups, replacing any unfinished evaluations of them."""
+        for group in groups:
+            self.discard(group)
+            group.simulation.flush()
+            group.simulation.shared = True
+            group.set_states(None)
+            future = self.executor.submit(evaluate, self.engine, group.simulation, list(group.objects))
+            future.add_done_callback(notify)
+            self.jobs[group] = future
+
+    def discard(self, group):
+        """Drops the unfinished evaluation of a group, if any."""
+        future = self.jobs.pop(group, None)
+        if future:
+            future.cancel()
+
+    def cancel(self):
+        """Drops every unfinished evaluation."""
+        for group in list(self.jobs):
+            self.discard(group)
+
+    def pending(self):
+        """Returns the groups that are still being evaluated."""
+        return list(self.jobs)
+
+    def update(self):
+        """Applies the results of every finished evaluation."""
+        for group, future in list(self.jobs.items()):
+            if future.done():
+                self.apply(group, self.jobs.pop(group))
+
+    def wait(self, groups=None):
+        """Waits for the evaluations of the given groups, or of all groups, and applies their results."""
+        for group in list(self.jobs if groups is None else groups):
+            if group in self.jobs:
+                self.apply(group, self.jobs.pop(group))
+
+    @profiled('quantum')
+    def apply(self, group, future):
+        """Applies the result of an evaluation, unless the group's objects changed since it started."""
+        states, order, readouts = future.result()
+        if len(readouts) != len(group.objects) or any(obj.group is not group for obj, _, _ in readouts):
+            return
+
+        for obj, probabilities, phase_Z in readouts:
+            obj.set_state(probabilities, phase_Z)
+        group.set_states(states, order)
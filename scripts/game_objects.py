@@ -1,56 +1,53 @@
 import pygame
+import threading
 from collections import OrderedDict
-import enum
 from scripts.common_functions import add_text
-import unitary.alpha as alpha
-from scripts.flip_phase import FlipPhase
-from math import acos, sqrt, pi
-
-
-gates = {
-    'X': alpha.Flip(),
-    'H': alpha.Superposition(),
-    'Z': alpha.Phase(),
-    'RotY': FlipPhase(-2 * acos(1 / sqrt(3)) / pi),
-    'CNOT': None,
-    'CHAD': None
+from scripts.assets import assets
+from scripts.profiler import profiled
+from scripts.game_state import gates, control_effects, effect_types, control_gates, clifford_gates, clifford_effects, Pillar, TileType, PlayerState, BoxState, PillarState
+
+
+gate_info_images = {
+    'X': 'x-gate',
+    'H': 'h-gate',
+    'Z': 'z-gate',
+    'RotY': 'roty-gate',
+    'CNOT': 'cnot-gate',
+    'CHAD': 'chad-gate'
 }
 
-gate_info_image = {
-    'X': pygame.image.load('./assets/x-gate.png'),
-    'H': pygame.image.load('./assets/h-gate.png'),
-    'Z': pygame.image.load('./assets/z-gate.png'),
-    'RotY': pygame.image.load('./assets/roty-gate.png'),
-    'CNOT': pygame.image.load('./assets/cnot-gate.png'),
-    'CHAD': pygame.image.load('./assets/chad-gate.png')
-}
-
-control_gates = ['CNOT', 'CHAD']
-
-# Load game object images
-tile_image = pygame.image.load('./assets/tile.png')
-end_tile_image = pygame.image.load('./assets/end_tile.png')
-pillar_image = pygame.image.load('./assets/pillar.png')
-box_image = pygame.image.load('./assets/box.png')
-wall_tile_image = pygame.image.load('./assets/wall.png')
-x_gate_image = pygame.image.load('./assets/x-gate.png')
-
 SCALE_FACTOR = 4
 BLOCK_SIZE = 16 * SCALE_FACTOR
 PEEK_COUNT = 1000
-
-class Pillar(enum.Enum):
-    """Enumeration for quantum object states."""
-    EMPTY = 0
-    FULL = 1
-
-class TileType(enum.Enum):
-    """Enumeration for different tile types."""
-    EMPTY = 0
-    START = 1
-    END = 2
-    DEL = 3
-    WALL = 4
+TINT_CACHE_SIZE = 256
+COLOR_STEP = 4  # Tint colors are rounded to multiples of this, so nearly equal colors share a cached image
+
+tint_cache = OrderedDict()
+tint_lock = threading.Lock()
+
+def tinted_image(name, color, alpha=255):
+    """Returns the named asset scaled by SCALE_FACTOR and multiplied with a color. Recently used results are kept
+    in a bounded cache keyed by quantized color and alpha, so they must never be drawn on."""
+    color_key = tuple(min(255, round(value / COLOR_STEP) * COLOR_STEP) for value in (*color, alpha))
+    key = (name, color_key)
+    with tint_lock:
+        if key in tint_cache:
+            tint_cache.move_to_end(key)
+            return tint_cache[key]
+
+        tinted = assets.scaled(name, SCALE_FACTOR).copy()
+        color_image = pygame.Surface(tinted.get_size()).convert_alpha()
+        color_image.fill(color_key)
+        tinted.blit(color_image, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+
+        tint_cache[key] = tinted
+        if len(tint_cache) > TINT_CACHE_SIZE:
+            tint_cache.popitem(last=False)
+        return tinted
+
+def grid_position(pixel_position):
+    """Returns the coordinates of the tile containing a pixel position."""
+    return (int(pixel_position[0] // BLOCK_SIZE), int(pixel_position[1] // BLOCK_SIZE))
 
 class BaseObject(pygame.sprite.Sprite):
     """Base class for all game objects that need to be represented as sprites."""
@@ -64,93 +61,61 @@ class BaseObject(pygame.sprite.Sprite):
         self.offset_y = 0
         self.dragging = False
     
-    def change_color(self, image, color, alpha=255):
-        """Changes the color of the object's image."""
-        image_rect = image.get_rect()
-        self.image = pygame.transform.scale(image, (int(image_rect.width * SCALE_FACTOR), int(image_rect.height * SCALE_FACTOR)))
-        self.colorImage.fill((*color, alpha))
-        self.image.blit(self.colorImage, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-
-class LootableObject(BaseObject):
+    @profiled('render')
+    def change_color(self, name, color, alpha=255):
+        """Changes the color of the object's image to the named asset multiplied with a color."""
+        self.image = tinted_image(name, color, alpha)
+
+class LootableObject(BaseObject, BoxState):
     """Represents an object that can be looted by the player."""
     def __init__(self, item, x, y):
         """Initializes the lootable object with an item and position."""
-        super().__init__(x, y)
-        box_rect = box_image.get_rect()
-        self.image = pygame.transform.scale(box_image, (int(box_rect.width * SCALE_FACTOR), int(box_rect.height * SCALE_FACTOR)))
+        BaseObject.__init__(self, x, y)
+        BoxState.__init__(self, item, x, y)
+        box_rect = assets.image('box').get_rect()
+        self.image = assets.scaled('box', SCALE_FACTOR)
         self.rect = self.image.get_rect()
         self.rect.x = x * BLOCK_SIZE
         self.rect.y = y * BLOCK_SIZE
-        self.item = item
         add_text(self, item, box_rect.width, box_rect.height)
 
     def function(self, game, x, y):
         """Adds the item to the player's hotbar and removes the object from the game. Called when player moves to tile object is in."""
-        game.hotbar.add_item(self.item, 1)
         self.kill()
-        del game.objects[str(x) + "," + str(y)]
-        return True
+        return BoxState.function(self, game, x, y)
 
-class QuantumObject(BaseObject, alpha.QuantumObject):
+class QuantumObject(BaseObject, PillarState):
     """Represents a quantum object in the game, currently only pillars."""
     def __init__(self, x, y, game):
         """Initializes the quantum object with position and basic state information."""
         BaseObject.__init__(self, x, y)
-        alpha.QuantumObject.__init__(self, str(x) + "," + str(y), Pillar.EMPTY)
-        wall_rect = pillar_image.get_rect()
-        self.image = pygame.transform.scale(pillar_image, (int(wall_rect.width * SCALE_FACTOR), int(wall_rect.height * SCALE_FACTOR)))
+        PillarState.__init__(self, x, y, game)
+        self.image = tinted_image('pillar', (255, 255, 255))
         self.rect = self.image.get_rect()
         self.rect.x = x * BLOCK_SIZE 
         self.rect.y = (y + 1) * BLOCK_SIZE - self.image.get_size()[1]
-
-        self.colorImage = pygame.Surface(self.image.get_size()).convert_alpha()
-        self.colorImage.fill((255, 255, 255, 255))
-        self.image.blit(self.colorImage, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
         self.color = None
 
-        self.phase_Z = False
-        game.quantum_grid.add_object(self)
-        self.states = game.quantum_grid.get_probabilities([self], PEEK_COUNT)[0]
-        self.group = game.grouping_system.add(self)
-
-    def apply_effect(self, game, effect=None):
-        """Applies a quantum effect to the object and updates its color based on the effect."""
+    def set_state(self, states, phase_Z):
+        """Sets the object's state and updates its color based on it."""
         color_alpha = 255
-
-        if effect == alpha.Superposition() and self.states[1] == 1.0:
-            self.phase_Z = True
-        elif effect == alpha.Phase() and self.states[0] != 1.0:
-            self.phase_Z = not self.phase_Z
-        elif effect == alpha.Superposition() or self.states[0] == 1.0:
-            self.phase_Z = False
-
-        if effect:
-            if isinstance(effect, list):
-                reference_obj = game.objects[str(effect[1][0]) + ',' + str(effect[1][1])]
-                alpha.quantum_if(self).apply(effect[0])(reference_obj)
-                game.grouping_system.join(self, reference_obj)
-                reference_obj.apply_effect(game)
-            else:
-                effect(self)
-            game.effect_history.append([effect, str(self.position[0]) + "," + str(self.position[1])])
-
-            ordered_dict = OrderedDict(sorted(game.quantum_grid.get_correlated_histogram(self.group.objects, count=PEEK_COUNT).items()))
-            self.group.states = ordered_dict
-
-        histogram = game.quantum_grid.get_probabilities([self], PEEK_COUNT)
-        self.states = histogram[0]
+        PillarState.set_state(self, states, phase_Z)
 
         self.color = (int(255 * self.states[0]), int(self.phase_Z) * 220, int(255 * self.states[1]))
         if self.states[0] == 1.0:
             color_alpha = 150
             self.color = (255, 255, 255)
 
-        self.change_color(pillar_image, self.color, color_alpha)
+        self.change_color('pillar', self.color, color_alpha)
+
+    def correlation_image(self, value):
+        """Returns the object's image for one of its correlated states, more opaque for state 1."""
+        return tinted_image('pillar', self.color, (value + 1) * 127)
 
     def function(self, game, x, y):
         """Checks if the quantum object's state allows interaction at the specified position. Called when player moves to tile object is in."""
-        if game.objects[str(x) + "," + str(y)].states[0] == 1.0:
-            return True
+        game.evaluator.wait([self.group])
+        return PillarState.function(self, game, x, y)
 
 class Tile(BaseObject):
     """Represents a tile on the game board."""
@@ -160,37 +125,34 @@ class Tile(BaseObject):
         self.type = type
         if type:
             if type == TileType.END:
-                image = end_tile_image
+                image = 'end_tile'
             elif type == TileType.WALL:
-                image = wall_tile_image
+                image = 'wall'
             else:
-                image = tile_image
+                image = 'tile'
 
-        tile_rect = image.get_rect()
-        self.image = pygame.transform.scale(image, (int(tile_rect.width * SCALE_FACTOR), int(tile_rect.height * SCALE_FACTOR)))
+        self.image = assets.scaled(image, SCALE_FACTOR)
         self.rect = self.image.get_rect()
         self.rect.x = x * BLOCK_SIZE
         self.rect.y = y * BLOCK_SIZE
 
-class Player(pygame.sprite.Sprite):
+class Player(pygame.sprite.Sprite, PlayerState):
     """Represents the player character in the game."""
     def __init__(self, x, y):
         """Initializes the player with position and image."""
-        super().__init__()
-        self.position = (x, y)
-        self.image = pygame.image.load("./assets/character.png")
-        self.rect = self.image.get_rect()
-        self.image = pygame.transform.scale(self.image, (int(self.rect.width * SCALE_FACTOR), int(self.rect.height * SCALE_FACTOR)))
+        pygame.sprite.Sprite.__init__(self)
+        PlayerState.__init__(self, x, y)
+        self.image = assets.scaled('character', SCALE_FACTOR)
         self.rect = self.image.get_rect()
         self.rect.x = x * BLOCK_SIZE
         self.rect.y = y * BLOCK_SIZE
 
     def update_position(self, x, y):
         """Updates the player's position and rectangle based on new coordinates."""
-        self.position = (x, y)
+        PlayerState.update_position(self, x, y)
+        self.move_image(x, y)
+
+    def move_image(self, x, y):
+        """Moves the player's rectangle to possibly fractional coordinates, without changing its position."""
         self.rect.x = x * BLOCK_SIZE
         self.rect.y = y * BLOCK_SIZE
-    
-    def distance(self, x, y):
-        """Checks if the player is within a 1-tile distance from the specified coordinates."""
-        return abs(self.position[0] - x) <= 1 and abs(self.position[1] - y) <= 1
@@ -0,0 +1,345 @@
+import copy
+import enum
+import unitary.alpha as alpha
+from scripts.flip_phase import FlipPhase
+from scripts.grouping_system import GroupingSystem, Group
+from scripts.quantum_engine import QuantumEngine, Backend
+from math import acos, sqrt, pi
+
+
+gates = {
+    'X': alpha.Flip(),
+    'H': alpha.Superposition(),
+    'Z': alpha.Phase(),
+    'RotY': FlipPhase(-2 * acos(1 / sqrt(3)) / pi),
+    'CNOT': None,
+    'CHAD': None
+}
+
+control_effects = {
+    'CNOT': alpha.Flip(),
+    'CHAD': alpha.Superposition()
+}
+
+effect_types = {
+    'Flip': alpha.Flip,
+    'Superposition': alpha.Superposition,
+    'Phase': alpha.Phase
+}
+
+control_gates = ['CNOT', 'CHAD']
+clifford_gates = ['X', 'H', 'Z', 'CNOT']
+clifford_effects = ['Flip', 'Superposition', 'Phase']
+
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]  # Up, down, left and right
+
+class Pillar(enum.Enum):
+    """Enumeration for quantum object states."""
+    EMPTY = 0
+    FULL = 1
+
+class TileType(enum.Enum):
+    """Enumeration for different tile types."""
+    EMPTY = 0
+    START = 1
+    END = 2
+    DEL = 3
+    WALL = 4
+
+class Action(enum.Enum):
+    """Enumeration for the actions a player can take."""
+    MOVE = 0
+    GATE = 1
+    CONTROL_GATE = 2
+
+def move(direction):
+    """Returns the action of moving the player one tile in a direction, given as (dx, dy)."""
+    return (Action.MOVE, direction)
+
+def apply_gate(gate, position):
+    """Returns the action of applying a gate from the inventory to the pillar at a position."""
+    return (Action.GATE, gate, position)
+
+def apply_control_gate(gate, position, target):
+    """Returns the action of applying a control gate from the inventory to the pillar at a position, controlling the pillar at the target."""
+    return (Action.CONTROL_GATE, gate, position, target)
+
+def is_clifford_level(data):
+    """Checks if every gate a level can apply is a Clifford gate, so it can run on a stabilizer tableau."""
+    items = list(data.gates) + [item for _, _, item in data.objects]
+    for _, _, effect_name, target in data.effects:
+        if effect_name not in clifford_effects:
+            return False
+        if target and effect_name != "Flip":
+            return False
+    return all(item in clifford_gates for item in items)
+
+class PlayerState:
+    """Represents the position of the player."""
+    def __init__(self, x, y):
+        """Initializes the player at a position."""
+        self.position = (x, y)
+
+    def update_position(self, x, y):
+        """Updates the player's position."""
+        self.position = (x, y)
+
+    def distance(self, x, y):
+        """Checks if the player is within a 1-tile distance from the specified coordinates."""
+        return abs(self.position[0] - x) <= 1 and abs(self.position[1] - y) <= 1
+
+class BoxState:
+    """Represents a box holding an item that the player loots by walking into it."""
+    def __init__(self, item, x, y):
+        """Initializes the box with an item and position."""
+        self.position = (x, y)
+        self.item = item
+
+    def function(self, state, x, y):
+        """Adds the item to the inventory and removes the box. Called when player moves to tile object is in."""
+        state.add_item(self.item, 1)
+        state.remove_object((x, y))
+        return True
+
+class PillarState(alpha.QuantumObject):
+    """Represents a pillar whose state is a qubit, which the player can only pass when it is surely in state |0>."""
+    def __init__(self, x, y, state):
+        """Initializes the pillar in state |0>, in a group and simulation of its own."""
+        alpha.QuantumObject.__init__(self, str(x) + "," + str(y), Pillar.EMPTY)
+        self.position = (x, y)
+        self.phase_Z = False
+        self.states = {Pillar.EMPTY.value: 1.0, Pillar.FULL.value: 0.0}
+        self.group = state.grouping_system.add(self)
+        state.quantum_engine.add_object(self)
+
+    def add_effect(self, state, effect):
+        """Adds a quantum effect to the object without evaluating the new state, and splits the affected objects
+        off their group when they are no longer entangled. Returns the objects whose state or group changed."""
+        changed_objects = [self]
+        if isinstance(effect, list):
+            reference_obj = state.objects[tuple(effect[1])]
+            state.grouping_system.join(self, reference_obj)
+            state.quantum_engine.apply_effect(alpha.quantum_if(self).apply(effect[0]), reference_obj)
+            changed_objects.append(reference_obj)
+        else:
+            state.quantum_engine.apply_effect(effect, self)
+
+        group = self.group
+        if state.grouping_system.split(group, changed_objects):
+            changed_objects += [obj for obj in group.objects if obj not in changed_objects]
+        return changed_objects
+
+    def apply_effect(self, state, effect):
+        """Applies a quantum effect to the object and evaluates the groups whose states changed."""
+        changed_objects = self.add_effect(state, effect)
+        state.evaluate(dict.fromkeys(obj.group for obj in changed_objects))
+
+    def update_state(self, state):
+        """Reads the object's state from the quantum engine."""
+        self.set_state(state.quantum_engine.get_probabilities([self])[0], state.quantum_engine.get_phase(self))
+
+    def set_state(self, states, phase_Z):
+        """Sets the object's state."""
+        self.states = states
+        self.phase_Z = phase_Z
+
+    def function(self, state, x, y):
+        """Checks if the quantum object's state allows interaction at the specified position. Called when player moves to tile object is in."""
+        return self.states[0] == 1.0
+
+class GameState:
+    """Holds the rules of the game and everything they act on, without any rendering, so games can be simulated headless.
+    Actions are taken with step. The pygame frontend builds on this class and overrides the hooks
+    that create objects, manage the inventory, evaluate quantum states and save checkpoints."""
+
+    def __init__(self, data=None, engine=None):
+        """Initializes an empty game state, or the state at the start of a level when its level data is given.
+        The quantum engine of a level uses the sampling settings of the given engine."""
+        self.tiles = {}
+        self.objects = {}  # Keyed by tile coordinates, like the tiles
+        self.player = None
+        self.inventory = {}
+        self.grouping_system = GroupingSystem()
+        self.quantum_engine = engine or QuantumEngine()
+        self.completed = False
+        if data:
+            self.load(data)
+
+    def load(self, data):
+        """Builds the tiles, objects, player, inventory and initial quantum state of a level from its level data."""
+        backend = Backend.STABILIZER if is_clifford_level(data) else Backend.SPARSE
+        self.quantum_engine = QuantumEngine(sampling=self.quantum_engine.sampling, count=self.quantum_engine.count, backend=backend)
+
+        for x, y, tile_type_str in data.tiles:
+            tile_type = TileType[tile_type_str]
+            self.tiles[(x, y)] = tile_type
+            self.create_tile(x, y, tile_type)
+
+            if tile_type == TileType.START:
+                self.player = self.create_player(x, y)
+
+        for x, y, item in data.objects:
+            self.objects[(x, y)] = self.create_box(item, x, y)
+
+        for x, y in data.quantum_objects:
+            self.objects[(x, y)] = self.create_pillar(x, y)
+
+        for gate, count in data.gates.items():
+            self.add_item(gate, count)
+
+        for x, y, effect_name, target in data.effects:
+            effect = effect_types[effect_name]()
+
+            if target:
+                effect = [effect, list(target)]
+
+            self.objects[(x, y)].add_effect(self, effect)
+
+        self.evaluate(list(self.grouping_system.groups))
+
+    def copy(self):
+        """Returns an independent copy of a headless state, to simulate ahead with. Objects and groups are copied,
+        while simulations are shared, like snapshots do, and only copied once either state changes them."""
+        state = copy.copy(self)
+        state.player = copy.copy(self.player)
+        state.inventory = dict(self.inventory)
+        state.objects = dict(self.objects)
+        state.grouping_system = GroupingSystem()
+        state.grouping_system.count = self.grouping_system.count
+        for group in self.grouping_system.groups:
+            new_group = Group()
+            new_group.set_states(group.states)
+            new_group.simulation = group.simulation
+            group.simulation.shared = True
+            for obj in group.objects:
+                new_obj = copy.copy(obj)
+                new_obj.group = new_group
+                new_group.objects.append(new_obj)
+                state.objects[obj.position] = new_obj
+            state.grouping_system.groups.add(new_group)
+        return state
+
+    # Below functions are hooks the frontend overrides.
+    def create_tile(self, x, y, tile_type):
+        """Called for every tile of a level. The headless state only keeps its type."""
+        pass
+
+    def create_player(self, x, y):
+        """Creates the player at a position."""
+        return PlayerState(x, y)
+
+    def create_box(self, item, x, y):
+        """Creates a box holding an item at a position."""
+        return BoxState(item, x, y)
+
+    def create_pillar(self, x, y):
+        """Creates a pillar at a position."""
+        return PillarState(x, y, self)
+
+    def items(self):
+        """Returns every item the inventory holds."""
+        return list(self.inventory)
+
+    def item_count(self, item):
+        """Returns how many of an item the inventory holds."""
+        return self.inventory.get(item, 0)
+
+    def add_item(self, item, count):
+        """Adds a number of an item to the inventory."""
+        self.inventory[item] = self.inventory.get(item, 0) + count
+
+    def use_item(self, item):
+        """Removes one of an item from the inventory."""
+        self.inventory[item] -= 1
+        if self.inventory[item] <= 0:
+            del self.inventory[item]
+
+    def remove_object(self, position):
+        """Removes the object at a position."""
+        del self.objects[position]
+
+    def evaluate(self, groups):
+        """Evaluates the states of the objects in the given groups."""
+        for group in groups:
+            for obj in group.objects:
+                obj.update_state(self)
+
+    def checkpoint(self):
+        """Returns a checkpoint of the current state to save once a move turns out to succeed, if checkpoints are kept."""
+        return None
+
+    def save_checkpoint(self, checkpoint=None):
+        """Called before every action that changes the state, with the checkpoint taken before it, if any."""
+        pass
+
+    # Below functions are the rules of the game.
+    def step(self, action):
+        """Takes an action, made by move, apply_gate or apply_control_gate. Returns if the action was allowed."""
+        if action[0] == Action.MOVE:
+            return self.move(*action[1])
+        elif action[0] == Action.GATE:
+            return self.apply_gate(*action[1:])
+        elif action[0] == Action.CONTROL_GATE:
+            return self.apply_control_gate(*action[1:])
+        return False
+
+    def move(self, dx, dy):
+        """Moves the player one tile, looting boxes and passing pillars in state |0>. Reaching the end tile completes the level."""
+        x, y = self.player.position
+        new_x, new_y = x + dx, y + dy
+        tile = self.tiles.get((new_x, new_y))
+        object_key = (new_x, new_y)
+
+        if tile == TileType.END:
+            self.player.update_position(new_x, new_y)
+            self.completed = True
+        elif object_key in self.objects:
+            checkpoint = self.checkpoint()
+            if not self.objects[object_key].function(self, new_x, new_y):
+                return False
+            self.save_checkpoint(checkpoint)
+            self.player.update_position(new_x, new_y)
+        elif tile and tile != TileType.WALL:
+            self.save_checkpoint()
+            self.player.update_position(new_x, new_y)
+        else:
+            return False
+        return True
+
+    def can_apply(self, gate, position):
+        """Checks if a gate from the inventory can be applied to the object at a position, which must be a pillar next to the player."""
+        obj = self.objects.get(position)
+        return self.item_count(gate) > 0 and isinstance(obj, PillarState) and self.player.distance(*position)
+
+    def apply_gate(self, gate, position):
+        """Applies a single-qubit gate from the inventory to the pillar at a position."""
+        if gate in control_gates or not self.can_apply(gate, position):
+            return False
+        self.save_checkpoint()
+        self.objects[position].apply_effect(self, gates[gate])
+        self.use_item(gate)
+        return True
+
+    def apply_control_gate(self, gate, position, target):
+        """Applies a control gate from the inventory to the pillar at a position, controlling the pillar at the target."""
+        target_obj = self.objects.get(target)
+        if gate not in control_gates or not self.can_apply(gate, position) or not isinstance(target_obj, PillarState) or position == target:
+            return False
+        self.save_checkpoint()
+        self.objects[position].apply_effect(self, [control_effects[gate], target])
+        self.use_item(gate)
+        return True
+
+    def actions(self):
+        """Returns the actions worth trying in the current state: a move in every direction, and every gate
+        in the inventory on every pillar next to the player. Moves can still turn out to be blocked."""
+        actions = [move(direction) for direction in DIRECTIONS]
+        pillars = [position for position, obj in self.objects.items() if isinstance(obj, PillarState)]
+        for gate in self.items():
+            for position in pillars:
+                if self.can_apply(gate, position):
+                    if gate in control_gates:
+                        actions.extend(apply_control_gate(gate, position, target) for target in pillars if target != position)
+                    else:
+                        actions.append(apply_gate(gate, position))
+        return actions
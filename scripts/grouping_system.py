@@ -1,31 +1,79 @@
+from collections import OrderedDict
+
 class Group:
     """Represents a group of objects in the game, which is used for visualizing entangled states."""
     def __init__(self):
-        """Initializes a new group with no objects and no states."""
+        """Initializes a new group with no objects, no states and no simulation."""
         self.objects = []
         self.states = None
+        self.simulation = None
+        self.order = []
+        self.frames = {}  # Images of the objects per index of a correlated state, built when first shown
+
+    def set_states(self, states, order=None):
+        """Sets the correlated states of the group's objects, and their order if it was already listed,
+        dropping the images built for the previous ones."""
+        self.states = states
+        self.order = order if order is not None else list(states or [])
+        self.frames = {}
+
+    def update_states(self, engine):
+        """Updates the correlated states of the group's objects from the quantum engine."""
+        self.set_states(OrderedDict(sorted(engine.get_correlated_histogram(self.objects).items())))
+
+    def frame(self, count):
+        """Returns the image of every object for the correlated state shown at a count, or None if the objects are not correlated.
+        The correlated states are cycled through, and the images of a state are only built the first time it is shown."""
+        if len(self.order) < 2:
+            return None
+        index = count % len(self.order)
+        if index not in self.frames:
+            state = self.order[index]
+            self.frames[index] = [obj.correlation_image(state[key]) for key, obj in enumerate(self.objects)]
+        return self.frames[index]
 
 class GroupingSystem:
-    """Manages groups of objects and their merging in the game."""
+    """Manages groups of objects, their merging and their splitting in the game.
+    Works like a union-find where every object points straight at the root of its group: merging
+    relabels the objects of the smaller group only, so finding a group never needs to follow a path."""
     def __init__(self):
-        """Initializes the grouping system with an empty list of groups and a count tracker."""
+        """Initializes the grouping system with an empty set of groups and a count tracker."""
         self.count = 0
-        self.groups = []
+        self.groups = set()
 
     def find(self, obj):
         """Finds and returns the group containing the specified object."""
-        for group in self.groups:
-            if obj in group.objects:
-                return group
-        return None
+        return obj.group
 
     def merge(self, group1, group2):
-        """Merges two groups into one."""
-        if group1 != group2 and group1 in self.groups and group2 in self.groups:
-            self.groups.remove(group2)
-            for obj in group2.objects:
-                obj.group = group1
-            group1.objects.extend(group2.objects)
+        """Merges two groups into the larger one, combining their simulations as well. Returns the merged group."""
+        if group1 == group2 or group1 not in self.groups or group2 not in self.groups:
+            return group1
+        if len(group1.objects) < len(group2.objects):
+            group1, group2 = group2, group1
+
+        self.groups.remove(group2)
+        if group1.simulation and group2.simulation:
+            group1.simulation = group1.simulation.writable().merge(group2.simulation)
+        for obj in group2.objects:
+            obj.group = group1
+        group1.objects.extend(group2.objects)
+        return group1
+
+    def split(self, group, objects):
+        """Moves each of the given objects that is no longer entangled with the rest of its group into a group
+        of its own, together with the simulation of its state. Returns the objects that were moved."""
+        separated = []
+        for obj in objects:
+            if obj.group is group and len(group.objects) > 1:
+                group.simulation = group.simulation.writable()
+                simulation = group.simulation.separate(obj.qubit)
+                if simulation:
+                    group.objects.remove(obj)
+                    obj.group = self.add(obj)
+                    obj.group.simulation = simulation
+                    separated.append(obj)
+        return separated
 
     def add(self, obj, group=None):
         """Adds an object to an existing group or creates a new group for the object."""
@@ -35,10 +83,9 @@ class GroupingSystem:
         else:
             new_group = Group()
             new_group.objects.append(obj)
-            self.groups.append(new_group)
+            self.groups.add(new_group)
             return new_group
 
     def join(self, obj, reference_obj):
         """Joins the group of one object with the group of another object."""
-        self.merge(obj.group, reference_obj.group)
-        return obj.group
\ No newline at end of file
+        return self.merge(obj.group, reference_obj.group)
\ No newline at end of file
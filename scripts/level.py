@@ -0,0 +1,50 @@
+import pygame
+from scripts.game_objects import *
+from scripts.game_state import GameState
+
+BACKGROUND_COLOR = (255, 255, 255)
+
+class Level(GameState):
+    """Holds everything a level describes: its tiles, objects, player, gates and initial quantum state, as sprites.
+    A level is built apart from the game, so the next level can be prepared on a background thread. Every cache it shares
+    with the game loop, of level packs, assets, tinted images, fonts and texts, is therefore guarded by a lock."""
+
+    def __init__(self, data, engine, screen_size):
+        """Builds the level from its level data, with the sampling settings of the given quantum engine."""
+        self.tile_sprites = pygame.sprite.Group()
+        self.object_sprites = pygame.sprite.Group()
+        super().__init__(data, engine)
+        self.render_background(screen_size)
+
+    def create_tile(self, x, y, tile_type):
+        """Creates the sprite of a tile."""
+        self.tile_sprites.add(Tile(x, y, tile_type))
+
+    def create_player(self, x, y):
+        """Creates the player's sprite."""
+        return Player(x, y)
+
+    def create_box(self, item, x, y):
+        """Creates the sprite of a box holding an item."""
+        new_obj = LootableObject(item, x, y)
+        self.object_sprites.add(new_obj)
+        return new_obj
+
+    def create_pillar(self, x, y):
+        """Creates the sprite of a pillar."""
+        new_obj = QuantumObject(x, y, self)
+        self.object_sprites.add(new_obj)
+        return new_obj
+
+    def evaluate(self, groups):
+        """Evaluates the state of the given groups and recolors their quantum objects in a single pass."""
+        for group in groups:
+            group.update_states(self.quantum_engine)
+            for obj in group.objects:
+                obj.update_state(self)
+
+    def render_background(self, screen_size):
+        """Pre-renders the background color and the tiles of the level, which never change within a level."""
+        self.background = pygame.Surface(screen_size).convert()
+        self.background.fill(BACKGROUND_COLOR)
+        self.tile_sprites.draw(self.background)
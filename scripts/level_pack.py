@@ -0,0 +1,210 @@
+import os
+import re
+import glob
+import json
+import mmap
+import struct
+import argparse
+import threading
+import numpy as np
+
+LEVEL_DIRECTORY = './levels'
+PACK_NAME = 'levels.pack'
+
+MAGIC = b'QLVP'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')  # Magic, version and number of levels
+NAME_TABLE = struct.Struct('<H')  # Byte length of a newline separated name table
+INDEX_ENTRY = struct.Struct('<HI')  # Level number and offset of its record
+COUNTS = struct.Struct('<5H')  # Number of tiles, objects, quantum objects, gates and effects of a level
+RECORD_WIDTHS = (3, 3, 2, 2, 5)  # Int16 values per tile, object, quantum object, gate and effect
+NO_TARGET = -32768  # Target coordinate of effects without a target
+
+POSITION_PATTERN = re.compile(r'\s*\(\s*(-?\d+)\s*,\s*(-?\d+)\s*\)\s*')
+
+def parse_position(text):
+    """Parses a position written as "(x,y)" into a tuple of integers, without evaluating it."""
+    match = POSITION_PATTERN.fullmatch(text)
+    if not match:
+        raise ValueError(f"Invalid position: {text!r}")
+    return (int(match.group(1)), int(match.group(2)))
+
+class LevelData:
+    """The contents of a level, with positions as tuples and tile types, items, gates and effects by name."""
+    def __init__(self, tiles, objects, quantum_objects, gates, effects):
+        """Initializes the level contents. Tiles and objects are (x, y, name) tuples, quantum objects (x, y) tuples,
+        gates map names to counts and effects are (x, y, name, target) tuples whose target is a position or None."""
+        self.tiles = tiles
+        self.objects = objects
+        self.quantum_objects = quantum_objects
+        self.gates = gates
+        self.effects = effects
+
+def read_json_level(filename):
+    """Reads a level from a JSON level file."""
+    with open(filename, "r") as file:
+        level_data = json.load(file)
+
+    tiles = [(*parse_position(position), tile_type) for position, tile_type in level_data["tiles"].items()]
+    objects = [(*parse_position(position), item) for position, item in level_data["objects"].items()]
+    quantum_objects = [parse_position(position) for position in level_data["quantum_objects"]]
+    effects = []
+    for effect_entry in level_data["effects"]:
+        target = parse_position(effect_entry["target"]) if "target" in effect_entry else None
+        effects.append((*parse_position(effect_entry["position"]), effect_entry["effect"], target))
+    return LevelData(tiles, objects, quantum_objects, dict(level_data["gates"]), effects)
+
+def level_files(directory=LEVEL_DIRECTORY):
+    """Returns the JSON level files in a directory by level number."""
+    files = {}
+    for filename in glob.glob(os.path.join(directory, '*.json')):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        if name.isdigit():
+            files[int(name)] = filename
+    return dict(sorted(files.items()))
+
+def compile_levels(directory=LEVEL_DIRECTORY, output=None):
+    """Compiles every JSON level file in a directory into a single level pack. Returns the name of the pack.
+    The pack holds tables of the tile types, items and effect names used, followed by an index of all levels
+    and one record per level of little-endian int16 arrays, in which every name is replaced by its table id."""
+    output = output or os.path.join(directory, PACK_NAME)
+    levels = {number: read_json_level(filename) for number, filename in level_files(directory).items()}
+    tables = ({}, {}, {})  # Ids of the tile types, items and effects
+
+    def name_id(table, name):
+        return table.setdefault(name, len(table))
+
+    records = []
+    for data in levels.values():
+        tiles = [(x, y, name_id(tables[0], tile_type)) for x, y, tile_type in data.tiles]
+        objects = [(x, y, name_id(tables[1], item)) for x, y, item in data.objects]
+        gates = [(name_id(tables[1], gate), count) for gate, count in data.gates.items()]
+        effects = [(x, y, name_id(tables[2], effect), *(target or (NO_TARGET, NO_TARGET))) for x, y, effect, target in data.effects]
+        sections = [tiles, objects, data.quantum_objects, gates, effects]
+        arrays = b''.join(np.array(section, dtype='<i2').tobytes() for section in sections)
+        records.append(COUNTS.pack(*map(len, sections)) + arrays)
+
+    header = HEADER.pack(MAGIC, VERSION, len(levels))
+    for table in tables:
+        names = '\n'.join(table).encode('utf-8')
+        header += NAME_TABLE.pack(len(names)) + names
+    header += b'\0' * (len(header) % 2)  # Keeps the int16 arrays aligned
+    offset = len(header) + INDEX_ENTRY.size * len(levels)
+    index = b''
+    for number, record in zip(levels, records):
+        index += INDEX_ENTRY.pack(number, offset)
+        offset += len(record)
+
+    # Written next to the pack and moved onto it, as a running game may have the old pack mapped into memory
+    contents = header + index + b''.join(records)
+    temporary = output + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(contents)
+    os.replace(temporary, output)
+    return output
+
+class LevelPack:
+    """A compiled level pack, memory-mapped so only the records of the levels that are loaded are read.
+    Nothing in the pack is evaluated: names are looked up in its tables, and malformed packs raise a ValueError."""
+    def __init__(self, filename):
+        """Maps the pack into memory and reads its name tables and level index."""
+        self.modified = os.path.getmtime(filename)
+        with open(filename, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, level_count = HEADER.unpack_from(self.buffer, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{filename} is not a level pack of version {VERSION}")
+            offset = HEADER.size
+            self.tables = []
+            for _ in range(3):
+                length, = NAME_TABLE.unpack_from(self.buffer, offset)
+                offset += NAME_TABLE.size
+                names = self.buffer[offset:offset + length].decode('utf-8')
+                self.tables.append(names.split('\n') if names else [])
+                offset += length
+            offset += offset % 2
+            self.index = dict(INDEX_ENTRY.iter_unpack(self.buffer[offset:offset + INDEX_ENTRY.size * level_count]))
+        except (struct.error, UnicodeDecodeError) as error:
+            raise ValueError(f"{filename} is not a valid level pack") from error
+
+    def close(self):
+        """Unmaps the pack. Levels can no longer be read from it afterwards."""
+        self.buffer.close()
+
+    def __contains__(self, number):
+        """Checks if the pack holds the level with the given number."""
+        return number in self.index
+
+    def name(self, table, name_id):
+        """Returns the name with the given id from one of the name tables."""
+        if not 0 <= name_id < len(self.tables[table]):
+            raise ValueError(f"Invalid name id in level pack: {name_id}")
+        return self.tables[table][name_id]
+
+    def level(self, number):
+        """Reads the level with the given number."""
+        offset = self.index[number]
+        try:
+            counts = COUNTS.unpack_from(self.buffer, offset)
+        except struct.error as error:
+            raise ValueError(f"Level {number} lies outside the level pack") from error
+        offset += COUNTS.size
+
+        sections = []
+        for count, width in zip(counts, RECORD_WIDTHS):
+            array = np.frombuffer(self.buffer, dtype='<i2', count=count * width, offset=offset)
+            sections.append(array.reshape(count, width).tolist())
+            offset += array.nbytes
+        tiles, objects, quantum_objects, gates, effects = sections
+
+        return LevelData(
+            [(x, y, self.name(0, tile_type)) for x, y, tile_type in tiles],
+            [(x, y, self.name(1, item)) for x, y, item in objects],
+            [(x, y) for x, y in quantum_objects],
+            {self.name(1, gate): count for gate, count in gates},
+            [(x, y, self.name(2, effect), None if target_x == NO_TARGET else (target_x, target_y)) for x, y, effect, target_x, target_y in effects]
+        )
+
+packs = {}
+pack_lock = threading.RLock()
+
+def open_pack(directory=LEVEL_DIRECTORY):
+    """Returns the level pack of a directory, opened once per version of the file, or None if there is none."""
+    filename = os.path.join(directory, PACK_NAME)
+    if not os.path.isfile(filename):
+        return None
+
+    with pack_lock:
+        if filename not in packs or packs[filename].modified != os.path.getmtime(filename):
+            if filename in packs:
+                packs.pop(filename).close()
+            packs[filename] = LevelPack(filename)
+        return packs[filename]
+
+def level_exists(number, directory=LEVEL_DIRECTORY):
+    """Checks if a level with the given number exists, as a JSON file or in the level pack."""
+    pack = open_pack(directory)
+    return os.path.isfile(os.path.join(directory, f"{number}.json")) or (pack is not None and number in pack)
+
+def load_level_data(number, directory=LEVEL_DIRECTORY):
+    """Reads the level with the given number from the level pack, or from its JSON file when the
+    pack does not hold it or is older than the file, so edited levels do not need to be compiled again.
+    The pack is read while holding its lock, so another thread cannot close it halfway."""
+    filename = os.path.join(directory, f"{number}.json")
+    with pack_lock:
+        pack = open_pack(directory)
+        if pack is not None and number in pack:
+            if not os.path.isfile(filename) or os.path.getmtime(filename) <= pack.modified:
+                return pack.level(number)
+    return read_json_level(filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compiles the JSON level files into a single level pack.")
+    parser.add_argument('directory', nargs='?', default=LEVEL_DIRECTORY, help=f'The directory of the level files (default is {LEVEL_DIRECTORY})')
+    parser.add_argument('--output', help=f'The file the pack is written to (default is {PACK_NAME} in the level directory)')
+    args = parser.parse_args()
+
+    print(f"Compiled levels into {compile_levels(args.directory, args.output)}")
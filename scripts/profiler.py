@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+TRACE_LIMIT = 500000  # Most recent trace events kept, so long sessions do not grow without bound
+FRAME_WINDOW = 120  # Frames the overlay statistics are taken over
+
+class Span:
+    """Records the time spent inside a with block as a trace event."""
+    def __init__(self, profiler, name, category):
+        """Initializes the span with its name and category."""
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.category, self.start, time.perf_counter())
+
+class Profiler:
+    """Collects the durations of instrumented calls as Chrome trace events, and the time spent on recent frames.
+    While disabled, instrumented calls only check a flag, so the instrumentation can stay in place."""
+    def __init__(self, limit=TRACE_LIMIT):
+        """Initializes the profiler, disabled and without any events."""
+        self.enabled = False
+        self.overlay = False
+        self.events = deque(maxlen=limit)
+        self.frame_times = deque(maxlen=FRAME_WINDOW)
+        self.origin = time.perf_counter()
+        self.thread_names = {}
+
+    def enable(self, overlay=False):
+        """Starts collecting events, and frame times for the on-screen overlay when asked for."""
+        self.enabled = True
+        self.overlay = overlay
+
+    def record(self, name, category, start, end):
+        """Records a call that ran from start to end, in seconds of time.perf_counter, on the current thread."""
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident, thread.name)
+        self.events.append((name, category, start, end, thread.ident))
+
+    def add_frame(self, frame_ms):
+        """Records the time spent on a frame, in milliseconds."""
+        self.frame_times.append(frame_ms)
+
+    def frame_stats(self):
+        """Returns the mean and maximum time spent on recent frames, in milliseconds."""
+        if not self.frame_times:
+            return 0.0, 0.0
+        return sum(self.frame_times) / len(self.frame_times), max(self.frame_times)
+
+    def trace(self):
+        """Returns the recorded events in the Chrome trace event format, with times in microseconds."""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}} for tid, name in self.thread_names.items()]
+        for name, category, start, end, tid in list(self.events):
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, filename):
+        """Writes the recorded events to a file that chrome://tracing or Perfetto can open."""
+        with open(filename, 'w') as file:
+            json.dump(self.trace(), file)
+
+profiler = Profiler()
+
+def profiled(category, name=None):
+    """Decorates a function so every call is recorded under a category while profiling is enabled."""
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with Span(profiler, span_name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,69 @@
+import numpy as np
+from scripts.state_vector_simulation import StateVectorSimulation, SparseSimulation
+from scripts.stabilizer_simulation import StabilizerSimulation
+from scripts.profiler import profiled
+
+PRECISION = 9  # Decimals kept for exact probabilities, so pure states compare equal to 1.0
+
+class Backend:
+    """Simulations a group can start out with."""
+    STATE_VECTOR = StateVectorSimulation
+    SPARSE = SparseSimulation
+    STABILIZER = StabilizerSimulation
+
+class QuantumEngine:
+    """Evaluates pillar states exactly from the simulations of their entanglement groups.
+    Every group is simulated on its own, so cost depends on the largest group only.
+    Groups start on the configured backend and switch from a stabilizer tableau to
+    amplitudes as soon as a non-Clifford gate is applied to them. Sparse amplitudes in
+    turn switch to a dense state vector once most of them are nonzero.
+    Sampling is still available as an optional mode."""
+
+    def __init__(self, sampling=False, count=1000, backend=Backend.SPARSE):
+        """Initializes the engine with optional sampling mode, shot count and starting backend."""
+        self.sampling = sampling
+        self.count = count
+        self.backend = backend
+        self.rng = np.random.default_rng()
+
+    def add_object(self, obj):
+        """Starts a new simulation for an object in its own group."""
+        obj.group.simulation = self.backend([obj.qubit])
+
+    @profiled('quantum')
+    def apply_effect(self, effect, *objects):
+        """Applies a quantum effect to the simulation of the group the objects belong to."""
+        group = objects[0].group
+        group.simulation = group.simulation.writable()
+        operations = list(effect.effect(*objects))
+        if not group.simulation.supports(operations):
+            group.simulation = group.simulation.to_state_vector()
+        group.simulation.add_operations(operations)
+        group.simulation = group.simulation.compact()
+
+    @profiled('quantum')
+    def distribution(self, objects, simulation=None):
+        """Returns the probabilities of the joint states of objects in one group, sampled when in sampling mode.
+        The states are read from the given simulation, or from the current simulation of the group."""
+        distribution = (simulation or objects[0].group.simulation).distribution(objects)
+        if self.sampling:
+            counts = self.rng.multinomial(self.count, np.array(list(distribution.values())) / sum(distribution.values()))
+            distribution = {states: count / self.count for states, count in zip(distribution, counts) if count}
+        distribution = {states: round(float(probability), PRECISION) for states, probability in distribution.items()}
+        return {states: probability for states, probability in distribution.items() if probability}
+
+    def get_probabilities(self, objects, simulation=None):
+        """Returns a list with the probability of each state for every given object."""
+        results = []
+        for obj in objects:
+            distribution = self.distribution([obj], simulation)
+            results.append({state: distribution.get((state,), 0.0) for state in range(2)})
+        return results
+
+    def get_phase(self, obj, simulation=None):
+        """Checks if the object's superposition carries a negative relative phase, like the |-> state."""
+        return round((simulation or obj.group.simulation).x_expectation(obj), PRECISION) < 0
+
+    def get_correlated_histogram(self, objects, simulation=None):
+        """Returns the probability of every joint state of the given objects that can occur."""
+        return self.distribution(objects, simulation)
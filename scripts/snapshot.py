@@ -0,0 +1,60 @@
+from scripts.game_objects import QuantumObject
+
+class Snapshot:
+    """Captures everything a level can change during play, so it can be restored without reloading the level.
+    Simulations are not copied but shared with the game, and only copied once the game changes them.
+    Groups that were still being evaluated are evaluated again after restoring."""
+    def __init__(self, game):
+        """Captures the objects, player position, hotbar, groups and quantum state of the game."""
+        self.objects = dict(game.objects)
+        self.positions = [(obj, obj.rect.topleft) for obj in self.objects.values()]
+        self.player_position = game.player.position
+        self.count = game.grouping_system.count
+        self.pending = game.evaluator.pending()
+
+        self.groups = [(group, list(group.objects), group.states, group.order, group.frames, group.simulation) for group in game.grouping_system.groups]
+        for group in game.grouping_system.groups:
+            group.simulation.shared = True
+        self.quantum_objects = [(obj, obj.group, obj.states, obj.phase_Z, obj.color, obj.image) for obj in self.objects.values() if isinstance(obj, QuantumObject)]
+        self.slots = [(key, slot, slot.count, slot.image) for key, slot in game.hotbar.slots.items()]
+
+    def restore(self, game):
+        """Restores the game to the captured state. The snapshot can be restored again afterwards."""
+        game.evaluator.cancel()
+        game.objects.clear()
+        game.objects.update(self.objects)
+        game.object_sprites.empty()
+        game.object_sprites.add(*self.objects.values())
+        for obj, topleft in self.positions:
+            obj.dragging = False
+            obj.rect.topleft = topleft
+        game.dragged_object = None
+        game.player.update_position(*self.player_position)
+        game.grouping_system.count = self.count
+
+        game.grouping_system.groups = set()
+        for group, objects, states, order, frames, simulation in self.groups:
+            group.objects = list(objects)
+            group.set_states(states, order)
+            group.frames = frames
+            group.simulation = simulation
+            game.grouping_system.groups.add(group)
+
+        for obj, group, states, phase_Z, color, image in self.quantum_objects:
+            obj.group = group
+            obj.states = states
+            obj.phase_Z = phase_Z
+            obj.color = color
+            obj.image = image
+
+        game.hotbar.slots.clear()
+        game.hotbar.sprites.empty()
+        for key, slot, count, image in self.slots:
+            slot.count = count
+            slot.image = image
+            slot.dragging = False
+            slot.rect.y = game.hotbar.rect.y
+            game.hotbar.slots[key] = slot
+            game.hotbar.sprites.add(slot)
+        game.hotbar.update_slots()
+        game.evaluator.submit(self.pending)
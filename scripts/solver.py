@@ -0,0 +1,197 @@
+import time
+import argparse
+import numpy as np
+from multiprocessing import Pipe, Process, cpu_count
+from scripts.game_state import GameState, BoxState, Action, DIRECTIONS
+from scripts.level_pack import load_level_data, level_files
+
+DECIMALS = 6  # Decimals of the amplitudes compared when hashing quantum states
+MIN_PARALLEL_CORES = 4  # With fewer cores, a single process searches faster than worker processes do
+HANDOFF_SIZE = 256  # Frontier states reached in the main process before the search is handed to the workers
+DIRECTION_NAMES = dict(zip(DIRECTIONS, ['up', 'down', 'left', 'right']))
+
+def group_key(group):
+    """Returns a canonical key of a group's quantum state: its nonzero amplitudes with the qubits ordered
+    by the positions of their pillars, without global phase and rounded, so equal states share a key."""
+    simulation = group.simulation.to_state_vector()
+    amplitudes = simulation.sparse_amplitudes()
+    n = len(simulation.qubits)
+    positions = {obj.qubit: obj.position for obj in group.objects}
+    axes = sorted(range(n), key=lambda axis: positions[simulation.qubits[axis]])
+
+    entries = sorted((tuple((index >> (n - 1 - axis)) & 1 for axis in axes), amplitude) for index, amplitude in amplitudes.items())
+    phase = np.conj(entries[0][1]) / abs(entries[0][1])
+    return (tuple(sorted(positions.values())),
+            tuple((bits, round(float((amplitude * phase).real), DECIMALS) + 0.0, round(float((amplitude * phase).imag), DECIMALS) + 0.0) for bits, amplitude in entries))
+
+def state_key(state, group_keys=None):
+    """Returns a canonical, hashable key of everything that decides how a game continues: the player position,
+    the inventory, the boxes that are left and the quantum state of every group. Group keys can be remembered
+    per simulation in a dict, for states that share simulations because they were copied from each other."""
+    quantum_state = []
+    for group in state.grouping_system.groups:
+        if group_keys is None:
+            quantum_state.append(group_key(group))
+        else:
+            if id(group.simulation) not in group_keys:
+                group_keys[id(group.simulation)] = (group.simulation, group_key(group))  # Holds the simulation, so its id is not reused
+            quantum_state.append(group_keys[id(group.simulation)][1])
+    boxes = tuple(sorted((position, obj.item) for position, obj in state.objects.items() if isinstance(obj, BoxState)))
+    return (state.player.position, tuple(sorted(state.inventory.items())), boxes, tuple(sorted(quantum_state)))
+
+def describe(action):
+    """Returns a readable description of an action."""
+    if action[0] == Action.MOVE:
+        return DIRECTION_NAMES.get(action[1], str(action[1]))
+    elif action[0] == Action.GATE:
+        return f"{action[1]} on {action[2]}"
+    return f"{action[1]} on {action[2]} controlling {action[3]}"
+
+def expand(state, keep_states=False, group_keys=None):
+    """Returns the key, action, completion and, if kept, the state of every state one allowed action away from a state.
+    Copies share the simulations of the state until they change them, so their unchanged groups are hashed only once.
+    Group keys can be remembered across expansions, as a simulation is never changed again once a copy shares it."""
+    children = []
+    group_keys = {} if group_keys is None else group_keys
+    for action in state.actions():
+        child = state.copy()
+        if child.step(action):
+            key = None if child.completed else state_key(child, group_keys)
+            children.append((key, action, child.completed, child if keep_states else None))
+    return children
+
+def default_workers():
+    """Returns the number of processes to search with by default: one per core, or only the main process on machines with few cores."""
+    return cpu_count() if cpu_count() >= MIN_PARALLEL_CORES else 1
+
+def work(connection):
+    """Runs a worker process, which keeps the states it generates and the group keys it computed for as long as
+    the search runs, so states cross processes only once. Every message lists the states to expand, as ids of
+    states kept from the previous depth or as states handed to the worker, and gets their children back with ids."""
+    kept = []
+    group_keys = {}
+    while True:
+        handles = connection.recv()
+        if handles is None:
+            break
+        frontier = [kept[handle] if isinstance(handle, int) else handle for handle in handles]
+        kept = []
+        expansions = []
+        for state in frontier:
+            children = []
+            for key, action, completed, child in expand(state, True, group_keys):
+                children.append((key, action, completed, len(kept)))
+                kept.append(child)
+            expansions.append(children)
+        connection.send(expansions)
+
+def expand_remote(frontier, connections):
+    """Has every frontier state expanded by the worker process that holds it, or it is handed to,
+    and returns their children, as ids in the worker that keeps them, in the order of the frontier."""
+    batches = [[] for _ in connections]
+    for index, (_, owner, _) in enumerate(frontier):
+        batches[owner].append(index)
+    for connection, batch in zip(connections, batches):
+        connection.send([frontier[index][2] for index in batch])
+
+    expansions = [None] * len(frontier)
+    for owner, (connection, batch) in enumerate(zip(connections, batches)):
+        for index, children in zip(batch, connection.recv()):
+            expansions[index] = [(key, action, completed, owner, child) for key, action, completed, child in children]
+    return expansions
+
+class SolverResult:
+    """The outcome of solving a level: the shortest solution, if any, and statistics of the search."""
+    def __init__(self, level, path, expanded, generated, unique, depth, seconds):
+        """Initializes the result with the solution path and the search statistics."""
+        self.level = level
+        self.path = path
+        self.expanded = expanded
+        self.generated = generated
+        self.unique = unique
+        self.depth = depth
+        self.seconds = seconds
+
+    def report(self):
+        """Returns a readable report of the result."""
+        if self.path is None:
+            outcome = f"Level {self.level}: no solution within {self.depth} actions"
+        else:
+            outcome = f"Level {self.level}: solved in {len(self.path)} actions: {', '.join(map(describe, self.path))}"
+        rate = self.expanded / self.seconds if self.seconds else 0
+        return (f"{outcome}\n  {self.expanded} states expanded, {self.generated} generated, {self.unique} unique, "
+                f"{self.generated - self.unique} transpositions, {self.seconds:.2f}s ({rate:.0f} states/s)")
+
+class Solver:
+    """Finds the shortest solution of a level with a breadth-first search over game states.
+    States are identified by their canonical key, and a transposition table keeps every key that was reached,
+    so states reached again through other actions are not searched twice. With more than one worker, every depth
+    of the search is expanded in parallel by worker processes once the frontier is large enough. Its states are then
+    handed to the workers once, and every worker keeps the children it generates, so only keys, actions and ids
+    come back to the main process, which keeps the table and the paths."""
+
+    def __init__(self, workers=None, max_depth=None):
+        """Initializes the solver with a number of processes, one per core on machines with enough cores by default, and an optional depth limit."""
+        self.workers = workers or default_workers()
+        self.max_depth = max_depth
+
+    def solve(self, level):
+        """Searches for the shortest solution of the level with the given number."""
+        data = load_level_data(level)
+        start_time = time.perf_counter()
+        start = GameState(data)
+        table = {state_key(start): 0}
+        frontier = [((), None, start)]  # Paths, with the worker holding the state, if any, and the state or its id there
+        group_keys = {}
+        connections = []
+        processes = []
+        expanded = generated = depth = 0
+        solution = None
+
+        try:
+            while frontier and solution is None and (self.max_depth is None or depth < self.max_depth):
+                depth += 1
+                if self.workers > 1 and not processes and len(frontier) >= HANDOFF_SIZE:
+                    for _ in range(self.workers):
+                        connection, worker_connection = Pipe()
+                        processes.append(Process(target=work, args=(worker_connection,), daemon=True))
+                        processes[-1].start()
+                        connections.append(connection)
+                    frontier = [(path, index % self.workers, state) for index, (path, _, state) in enumerate(frontier)]
+
+                if processes:
+                    expansions = expand_remote(frontier, connections)
+                else:
+                    expansions = [[(key, action, completed, None, child) for key, action, completed, child in expand(state, True, group_keys)]
+                                  for _, _, state in frontier]
+
+                next_frontier = []
+                for (path, _, _), children in zip(frontier, expansions):
+                    expanded += 1
+                    for key, action, completed, owner, child in children:
+                        generated += 1
+                        if completed:
+                            solution = solution or path + (action,)
+                        elif key not in table:
+                            table[key] = depth
+                            next_frontier.append((path + (action,), owner, child))
+                frontier = next_frontier
+        finally:
+            for connection in connections:
+                connection.send(None)
+            for process in processes:
+                process.join()
+
+        return SolverResult(level, solution, expanded, generated, len(table), depth, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finds the shortest solution of levels and reports search statistics.")
+    parser.add_argument('levels', nargs='*', type=int, help='The levels to solve (default is every level)')
+    parser.add_argument('--workers', type=int, default=default_workers(), help=f'The number of processes to search with (default is {default_workers()}, one per core with at least {MIN_PARALLEL_CORES} cores)')
+    parser.add_argument('--max-depth', type=int, help='The most actions a solution may take (default is no limit)')
+    args = parser.parse_args()
+
+    solver = Solver(args.workers, args.max_depth)
+    for level in args.levels or list(level_files()):
+        print(solver.solve(level).report())
@@ -0,0 +1,280 @@
+import cirq
+import numpy as np
+from scripts.state_vector_simulation import SparseSimulation, TOLERANCE
+
+# Steps rotating the eigenstates of Z, X and Y to the Z basis, and the steps rotating them back
+BASIS_ROTATIONS = [([], []), (['H'], ['H']), (['S', 'S', 'S', 'H'], ['H', 'S'])]
+
+def clifford_steps(operation):
+    """Translates an operation into tableau steps, or returns None when it is not a supported Clifford gate."""
+    gate = operation.gate
+    qubits = operation.qubits
+    exponent = getattr(gate, 'exponent', None)
+    if isinstance(exponent, (int, float)) and getattr(gate, 'global_shift', 0) == 0:
+        half_turns = exponent % 2
+        if isinstance(gate, (cirq.XPowGate, cirq.YPowGate, cirq.ZPowGate, cirq.HPowGate, cirq.CXPowGate, cirq.CZPowGate)) and abs(half_turns) < TOLERANCE:
+            return []
+        if abs(half_turns - 1) < TOLERANCE:
+            if isinstance(gate, cirq.XPowGate):
+                return [('X', qubits)]
+            if isinstance(gate, cirq.YPowGate):
+                return [('Y', qubits)]
+            if isinstance(gate, cirq.ZPowGate):
+                return [('Z', qubits)]
+            if isinstance(gate, cirq.HPowGate):
+                return [('H', qubits)]
+            if isinstance(gate, cirq.CXPowGate):
+                return [('CNOT', qubits)]
+            if isinstance(gate, cirq.CZPowGate):
+                return [('H', qubits[1:]), ('CNOT', qubits), ('H', qubits[1:])]
+        if isinstance(gate, cirq.ZPowGate) and abs(half_turns - 0.5) < TOLERANCE:
+            return [('S', qubits)]
+        if isinstance(gate, cirq.ZPowGate) and abs(half_turns - 1.5) < TOLERANCE:
+            return [('S', qubits)] * 3
+    if isinstance(gate, cirq.ControlledGate) and gate.num_controls() == 1 and gate == cirq.ControlledGate(gate.sub_gate):
+        sub_steps = clifford_steps(gate.sub_gate.on(qubits[1]))
+        if sub_steps == [('X', qubits[1:])]:
+            return [('CNOT', qubits)]
+        if sub_steps == [('Z', qubits[1:])]:
+            return [('H', qubits[1:]), ('CNOT', qubits), ('H', qubits[1:])]
+        if sub_steps == []:
+            return []
+    return None
+
+class StabilizerSimulation:
+    """Simulates the objects of a single entanglement group on a stabilizer tableau.
+    Only Clifford gates are supported, but their cost is polynomial in the number of qubits.
+    Rows 0 to n-1 of the tableau hold the destabilizers, rows n to 2n-1 the stabilizers."""
+
+    def __init__(self, qubits):
+        """Initializes the tableau with all qubits in the |0> state."""
+        self.qubits = list(qubits)
+        n = len(self.qubits)
+        self.x = np.zeros((2 * n, n), dtype=bool)
+        self.z = np.zeros((2 * n, n), dtype=bool)
+        self.r = np.zeros(2 * n, dtype=bool)
+        self.x[np.arange(n), np.arange(n)] = True
+        self.z[np.arange(n, 2 * n), np.arange(n)] = True
+        self.shared = False
+
+    def copy(self):
+        """Returns an independent copy of the tableau."""
+        copy = StabilizerSimulation([])
+        copy.qubits = list(self.qubits)
+        copy.x, copy.z, copy.r = self.x.copy(), self.z.copy(), self.r.copy()
+        return copy
+
+    def writable(self):
+        """Returns this simulation, or a copy of it when it is shared with a snapshot."""
+        return self.copy() if self.shared else self
+
+    def flush(self, qubits=None):
+        """Does nothing, as gates are applied to the tableau right away."""
+        pass
+
+    def supports(self, operations):
+        """Checks if every operation is a Clifford gate the tableau can simulate."""
+        return all(clifford_steps(operation) is not None for operation in operations)
+
+    def add_operations(self, operations):
+        """Applies Clifford operations to the tableau."""
+        for operation in operations:
+            for name, qubits in clifford_steps(operation):
+                axes = [self.qubits.index(qubit) for qubit in qubits]
+                getattr(self, 'apply_' + name)(*axes)
+
+    def apply_X(self, a):
+        """Applies an X gate to qubit a, flipping the sign of every row with Z on it."""
+        self.r ^= self.z[:, a]
+
+    def apply_Y(self, a):
+        """Applies a Y gate to qubit a, flipping the sign of every row with X or Z, but not both, on it."""
+        self.r ^= self.x[:, a] ^ self.z[:, a]
+
+    def apply_Z(self, a):
+        """Applies a Z gate to qubit a, flipping the sign of every row with X on it."""
+        self.r ^= self.x[:, a]
+
+    def apply_H(self, a):
+        """Applies a Hadamard gate to qubit a, swapping its X and Z columns."""
+        self.r ^= self.x[:, a] & self.z[:, a]
+        self.x[:, a], self.z[:, a] = self.z[:, a].copy(), self.x[:, a].copy()
+
+    def apply_S(self, a):
+        """Applies an S gate to qubit a, turning X into Y on it."""
+        self.r ^= self.x[:, a] & self.z[:, a]
+        self.z[:, a] ^= self.x[:, a]
+
+    def apply_CNOT(self, a, b):
+        """Applies a CNOT gate with qubit a as control and qubit b as target."""
+        self.r ^= self.x[:, a] & self.z[:, b] & ~(self.x[:, b] ^ self.z[:, a])
+        self.x[:, b] ^= self.x[:, a]
+        self.z[:, a] ^= self.z[:, b]
+
+    def row_product(self, x1, z1, r1, x2, z2, r2):
+        """Returns the Pauli product of two rows, tracking the sign of the result."""
+        x1, z1, x2, z2 = (v.astype(np.int8) for v in (x1, z1, x2, z2))
+        phase = np.where(x1 & z1, z2 - x2, 0) + np.where(x1 & (1 - z1), z2 * (2 * x2 - 1), 0) + np.where((1 - x1) & z1, x2 * (1 - 2 * z2), 0)
+        total = (2 * int(r1) + 2 * int(r2) + int(phase.sum())) % 4
+        return (x1 ^ x2).astype(bool), (z1 ^ z2).astype(bool), total == 2
+
+    def rowsum(self, h, i):
+        """Multiplies row h of the tableau by row i."""
+        self.x[h], self.z[h], self.r[h] = self.row_product(self.x[h], self.z[h], self.r[h], self.x[i], self.z[i], self.r[i])
+
+    def random_row(self, a):
+        """Returns the first stabilizer anticommuting with Z on qubit a, or None when its outcome is determined."""
+        n = len(self.qubits)
+        rows = np.nonzero(self.x[n:, a])[0]
+        return n + rows[0] if len(rows) else None
+
+    def deterministic_outcome(self, a):
+        """Returns the outcome of measuring qubit a, which must not be random."""
+        n = len(self.qubits)
+        x, z, r = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool), False
+        for i in np.nonzero(self.x[:n, a])[0]:
+            x, z, r = self.row_product(x, z, r, self.x[i + n], self.z[i + n], self.r[i + n])
+        return int(r)
+
+    def collapse(self, a, outcome):
+        """Projects qubit a onto the given outcome, which must be possible."""
+        p = self.random_row(a)
+        if p is None:
+            return
+        n = len(self.qubits)
+        for i in np.nonzero(self.x[:, a])[0]:
+            if i != p:
+                self.rowsum(i, p)
+        self.x[p - n], self.z[p - n], self.r[p - n] = self.x[p], self.z[p], self.r[p]
+        self.x[p], self.z[p] = False, False
+        self.z[p, a] = True
+        self.r[p] = bool(outcome)
+
+    def merge(self, other):
+        """Joins another group's simulation into this one. The tableaux are combined block-diagonally,
+        unless the other group already needs a state vector."""
+        if not isinstance(other, StabilizerSimulation):
+            return self.to_state_vector().merge(other)
+
+        n, m = len(self.qubits), len(other.qubits)
+        x = np.zeros((2 * (n + m), n + m), dtype=bool)
+        z = np.zeros_like(x)
+        r = np.zeros(2 * (n + m), dtype=bool)
+        for source, rows, columns in ((self, n, slice(0, n)), (other, m, slice(n, n + m))):
+            offset = 0 if source is self else n
+            for half in range(2):
+                target = slice(half * (n + m) + offset, half * (n + m) + offset + rows)
+                x[target, columns] = source.x[half * rows:(half + 1) * rows]
+                z[target, columns] = source.z[half * rows:(half + 1) * rows]
+                r[target] = source.r[half * rows:(half + 1) * rows]
+        self.qubits = self.qubits + other.qubits
+        self.x, self.z, self.r = x, z, r
+        return self
+
+    def compact(self):
+        """Returns this simulation, as the tableau is already the cheapest representation."""
+        return self
+
+    def remove_qubit(self, a):
+        """Removes qubit a from the tableau, which must be in a Z basis state. The stabilizers are reduced
+        so only one of them acts on qubit a, after which it and its destabilizer are dropped."""
+        n = len(self.qubits)
+        rows = n + np.nonzero(self.z[n:, a])[0]
+        p = rows[0]
+        for i in rows[1:]:
+            self.rowsum(i, p)
+            self.rowsum(p - n, i - n)
+
+        keep_rows = [i for i in range(2 * n) if i not in (p, p - n)]
+        keep_columns = [b for b in range(n) if b != a]
+        self.qubits.pop(a)
+        self.x = self.x[np.ix_(keep_rows, keep_columns)]
+        self.z = self.z[np.ix_(keep_rows, keep_columns)]
+        self.r = self.r[keep_rows]
+
+        # Dropping qubit a can make destabilizers anticommute, which is fixed by multiplying them with stabilizers
+        n -= 1
+        for i in range(n):
+            anticommuting = (self.x[i] & self.z[:i]).sum(axis=1) + (self.z[i] & self.x[:i]).sum(axis=1)
+            for j in np.nonzero(anticommuting % 2)[0]:
+                self.rowsum(i, n + j)
+
+    def separate(self, qubit):
+        """Removes a qubit that is not entangled with the others from the tableau and returns a tableau
+        of its own state, or returns None when the qubit is entangled. A stabilizer state qubit is only
+        unentangled in an eigenstate of X, Y or Z, which is rotated to the Z basis before removing it."""
+        a = self.qubits.index(qubit)
+        for rotation, inverse in BASIS_ROTATIONS:
+            rotated = self.copy()
+            for name in rotation:
+                getattr(rotated, 'apply_' + name)(a)
+            if rotated.random_row(a) is None:
+                break
+        else:
+            return None
+
+        single = StabilizerSimulation([qubit])
+        if rotated.deterministic_outcome(a):
+            single.apply_X(0)
+        for name in inverse:
+            getattr(single, 'apply_' + name)(0)
+
+        rotated.remove_qubit(a)
+        self.qubits, self.x, self.z, self.r = rotated.qubits, rotated.x, rotated.z, rotated.r
+        return single
+
+    def apply_stabilizer(self, amplitudes, row):
+        """Applies the Pauli operator of a tableau row to sparse amplitudes keyed by basis state index."""
+        n = len(self.qubits)
+        x_mask = sum(1 << (n - 1 - int(a)) for a in np.nonzero(self.x[row])[0])
+        z_mask = sum(1 << (n - 1 - int(a)) for a in np.nonzero(self.z[row])[0])
+        phase = (-1 if self.r[row] else 1) * 1j ** bin(x_mask & z_mask).count('1')
+        return {index ^ x_mask: amplitude * phase * (-1) ** bin(index & z_mask).count('1') for index, amplitude in amplitudes.items()}
+
+    def to_state_vector(self):
+        """Converts the stabilizer state into amplitudes, used when a non-Clifford gate arrives.
+        A basis state that can occur is projected onto the state by every stabilizer, so only
+        the nonzero amplitudes are ever computed."""
+        n = len(self.qubits)
+        collapsed = self.copy()
+        index = 0
+        for a in range(n):
+            outcome = 0 if collapsed.random_row(a) is not None else collapsed.deterministic_outcome(a)
+            collapsed.collapse(a, outcome)
+            index |= outcome << (n - 1 - a)
+
+        amplitudes = {index: 1 + 0j}
+        for row in range(n, 2 * n):
+            projected = dict(amplitudes)
+            for key, amplitude in self.apply_stabilizer(amplitudes, row).items():
+                projected[key] = projected.get(key, 0) + amplitude
+            amplitudes = {key: amplitude for key, amplitude in projected.items() if abs(amplitude) > TOLERANCE}
+        norm = sum(abs(amplitude) ** 2 for amplitude in amplitudes.values()) ** 0.5
+        return SparseSimulation(self.qubits, {key: amplitude / norm for key, amplitude in amplitudes.items()}).compact()
+
+    def x_expectation(self, obj):
+        """Returns the expectation value of X on the object's qubit, which is negative for a |-> like phase."""
+        rotated = self.copy()
+        a = self.qubits.index(obj.qubit)
+        rotated.apply_H(a)
+        if rotated.random_row(a) is not None:
+            return 0.0
+        return 1.0 - 2 * rotated.deterministic_outcome(a)
+
+    def distribution(self, objects):
+        """Returns the probability of every joint state of the given objects that can occur,
+        by branching on every random measurement outcome."""
+        branches = [((), 1.0, self)]
+        for obj in objects:
+            a = self.qubits.index(obj.qubit)
+            next_branches = []
+            for states, probability, tableau in branches:
+                if tableau.random_row(a) is None:
+                    next_branches.append((states + (tableau.deterministic_outcome(a),), probability, tableau))
+                else:
+                    for outcome in range(2):
+                        collapsed = tableau.copy()
+                        collapsed.collapse(a, outcome)
+                        next_branches.append((states + (outcome,), probability / 2, collapsed))
+            branches = next_branches
+        return {states: probability for states, probability, _ in branches}
@@ -0,0 +1,269 @@
+import cirq
+import numpy as np
+from functools import lru_cache
+
+TOLERANCE = 1e-9
+DENSE_FRACTION = 0.25  # Sparse simulations switch to a dense state vector above this fraction of nonzero amplitudes
+
+@lru_cache(maxsize=None)
+def gate_unitary(gate):
+    """Returns the unitary matrix of a gate, computed once per distinct gate."""
+    return cirq.unitary(gate)
+
+def is_identity(matrix):
+    """Checks if a single-qubit unitary equals the identity up to a global phase."""
+    return abs(abs(np.trace(matrix)) - 2) < TOLERANCE
+
+def pure_qubit_state(probability_0, probability_1, coherence):
+    """Returns the state of a qubit from its reduced density matrix, given by the probabilities and the
+    off-diagonal element <0|rho|1>, or None when the matrix is mixed because the qubit is entangled."""
+    if probability_0 * probability_1 - abs(coherence) ** 2 > TOLERANCE:
+        return None
+    if probability_0 >= probability_1:
+        state = np.array([np.sqrt(probability_0), np.conj(coherence) / np.sqrt(probability_0)])
+    else:
+        state = np.array([coherence / np.sqrt(probability_1), np.sqrt(probability_1)])
+    return state / np.linalg.norm(state)
+
+class AmplitudeSimulation:
+    """Base class for simulations that store the amplitudes of a group's state.
+    Single-qubit gates are fused per qubit and only applied once a multi-qubit gate
+    needs that qubit or the state is read. Fused gates equal to the identity are dropped."""
+
+    def __init__(self, qubits):
+        """Initializes the list of qubits and the fused single-qubit gates waiting to be applied."""
+        self.qubits = list(qubits)
+        self.pending = {}
+        self.shared = False
+
+    def supports(self, operations):
+        """Checks if the operations can be simulated by this simulation, which is always the case."""
+        return True
+
+    def add_operations(self, operations):
+        """Adds operations on this group's qubits."""
+        for operation in operations:
+            if len(operation.qubits) == 1:
+                qubit = operation.qubits[0]
+                matrix = gate_unitary(operation.gate)
+                if qubit in self.pending:
+                    matrix = matrix @ self.pending[qubit]
+                self.pending[qubit] = matrix
+            else:
+                self.flush(operation.qubits)
+                self.apply_operation(operation, [self.qubits.index(qubit) for qubit in operation.qubits])
+
+    def flush(self, qubits=None):
+        """Applies the fused single-qubit gates of the given qubits, or of all qubits, skipping identities."""
+        for qubit in list(self.pending if qubits is None else qubits):
+            matrix = self.pending.pop(qubit, None)
+            if matrix is not None and not is_identity(matrix):
+                self.apply_matrix(matrix, [self.qubits.index(qubit)])
+
+    def writable(self):
+        """Returns this simulation, or a copy of it when it is shared with a snapshot."""
+        return self.copy() if self.shared else self
+
+    def to_state_vector(self):
+        """Returns this simulation, as it already stores amplitudes."""
+        return self
+
+    def compact(self):
+        """Returns the cheapest simulation for the current state, which is this one by default."""
+        return self
+
+class StateVectorSimulation(AmplitudeSimulation):
+    """Simulates the objects of a single entanglement group as a dense state vector.
+    The amplitudes are kept between moves and updated in place by every new operation."""
+
+    def __init__(self, qubits, amplitudes=None):
+        """Initializes the simulation with the given amplitudes, or all qubits in the |0> state."""
+        super().__init__(qubits)
+        if amplitudes is None:
+            amplitudes = np.zeros((2,) * len(self.qubits), dtype=np.complex128)
+            amplitudes[(0,) * len(self.qubits)] = 1
+        self.amplitudes = amplitudes
+        self.buffer = np.empty_like(self.amplitudes)
+
+    def copy(self):
+        """Returns an independent copy of the simulation."""
+        copy = StateVectorSimulation(self.qubits, self.amplitudes.copy())
+        copy.pending = dict(self.pending)
+        return copy
+
+    def apply_operation(self, operation, axes):
+        """Applies a multi-qubit operation to the amplitudes, in place."""
+        args = cirq.ApplyUnitaryArgs(self.amplitudes, self.buffer, axes)
+        self.swap_buffer(cirq.apply_unitary(operation, args))
+
+    def apply_matrix(self, matrix, axes):
+        """Applies a unitary matrix on the given axes to the amplitudes, in place."""
+        matrix = matrix.reshape((2,) * (2 * len(axes)))
+        self.swap_buffer(cirq.targeted_left_multiply(matrix, self.amplitudes, axes, out=self.buffer))
+
+    def swap_buffer(self, result):
+        """Makes the result of an operation the current amplitudes, reusing the old array as buffer."""
+        if result is self.buffer:
+            self.buffer = self.amplitudes
+        self.amplitudes = result
+
+    def sparse_amplitudes(self):
+        """Returns the nonzero amplitudes, keyed by the index of their basis state."""
+        self.flush()
+        flat = self.amplitudes.reshape(-1)
+        return {int(index): complex(flat[index]) for index in np.nonzero(np.abs(flat) > TOLERANCE)[0]}
+
+    def merge(self, other):
+        """Joins another group's simulation into this one through the tensor product of both states."""
+        other = other.to_state_vector()
+        if isinstance(other, SparseSimulation):
+            return SparseSimulation(self.qubits, self.sparse_amplitudes()).merge(other)
+
+        self.flush()
+        other.flush()
+        self.qubits = self.qubits + other.qubits
+        self.amplitudes = np.multiply.outer(self.amplitudes, other.amplitudes)
+        self.buffer = np.empty_like(self.amplitudes)
+        return self
+
+    def separate(self, qubit):
+        """Removes a qubit that is not entangled with the others from the simulation and returns a simulation
+        of its own state, or returns None when the qubit is entangled."""
+        self.flush()
+        axis = self.qubits.index(qubit)
+        amplitudes = np.moveaxis(self.amplitudes, axis, 0).reshape(2, -1)
+        state = pure_qubit_state(np.vdot(amplitudes[0], amplitudes[0]).real, np.vdot(amplitudes[1], amplitudes[1]).real, np.vdot(amplitudes[1], amplitudes[0]))
+        if state is None:
+            return None
+
+        rest = np.conj(state[0]) * amplitudes[0] + np.conj(state[1]) * amplitudes[1]
+        self.qubits.pop(axis)
+        self.amplitudes = (rest / np.linalg.norm(rest)).reshape((2,) * len(self.qubits))
+        self.buffer = np.empty_like(self.amplitudes)
+        return StateVectorSimulation([qubit], state)
+
+    def x_expectation(self, obj):
+        """Returns the expectation value of X on the object's qubit, which is negative for a |-> like phase."""
+        self.flush()
+        amplitudes = np.moveaxis(self.amplitudes, self.qubits.index(obj.qubit), 0).reshape(2, -1)
+        return 2 * float(np.real(np.vdot(amplitudes[1], amplitudes[0])))
+
+    def distribution(self, objects):
+        """Returns the probability of every joint state of the given objects that can occur."""
+        self.flush()
+        probabilities = np.abs(self.amplitudes) ** 2
+        axes = [self.qubits.index(obj.qubit) for obj in objects]
+        other_axes = tuple(axis for axis in range(len(self.qubits)) if axis not in axes)
+        table = np.transpose(probabilities.sum(axis=other_axes), np.argsort(np.argsort(axes)))
+        return {tuple(int(state) for state in states): float(table[states]) for states in zip(*np.nonzero(table > TOLERANCE))}
+
+class SparseSimulation(AmplitudeSimulation):
+    """Simulates the objects of a single entanglement group by storing only its nonzero amplitudes.
+    Memory and time scale with the number of basis states that can occur, which stays small
+    while most pillars are in a basis state. Basis states are indexed like a dense state vector,
+    with the first qubit as the most significant bit."""
+
+    def __init__(self, qubits, amplitudes=None):
+        """Initializes the simulation with the given amplitudes, or all qubits in the |0> state."""
+        super().__init__(qubits)
+        self.amplitudes = {0: 1 + 0j} if amplitudes is None else amplitudes
+
+    def copy(self):
+        """Returns an independent copy of the simulation."""
+        copy = SparseSimulation(self.qubits, dict(self.amplitudes))
+        copy.pending = dict(self.pending)
+        return copy
+
+    def apply_operation(self, operation, axes):
+        """Applies a multi-qubit operation to the nonzero amplitudes."""
+        self.apply_matrix(gate_unitary(operation.gate), axes)
+
+    def apply_matrix(self, matrix, axes):
+        """Applies a unitary matrix on the given axes to the nonzero amplitudes."""
+        n = len(self.qubits)
+        shifts = [n - 1 - axis for axis in axes]
+        mask = sum(1 << shift for shift in shifts)
+        spread = [sum(((row >> (len(axes) - 1 - j)) & 1) << shift for j, shift in enumerate(shifts)) for row in range(len(matrix))]
+
+        amplitudes = {}
+        for index, amplitude in self.amplitudes.items():
+            column = sum(((index >> shift) & 1) << (len(axes) - 1 - j) for j, shift in enumerate(shifts))
+            base = index & ~mask
+            for row, bits in enumerate(spread):
+                coefficient = matrix[row, column]
+                if coefficient:
+                    amplitudes[base | bits] = amplitudes.get(base | bits, 0) + coefficient * amplitude
+        self.amplitudes = {index: amplitude for index, amplitude in amplitudes.items() if abs(amplitude) > TOLERANCE}
+
+    def sparse_amplitudes(self):
+        """Returns the nonzero amplitudes, keyed by the index of their basis state."""
+        self.flush()
+        return self.amplitudes
+
+    def merge(self, other):
+        """Joins another group's simulation into this one through the tensor product of both states."""
+        other = other.to_state_vector()
+        self.flush()
+        other_amplitudes = other.sparse_amplitudes()
+        shift = len(other.qubits)
+        self.amplitudes = {(index << shift) | other_index: amplitude * other_amplitude
+                           for index, amplitude in self.amplitudes.items()
+                           for other_index, other_amplitude in other_amplitudes.items()}
+        self.qubits = self.qubits + other.qubits
+        return self.compact()
+
+    def compact(self):
+        """Switches to a dense state vector once enough amplitudes are nonzero for it to be cheaper.
+        Pending gates are left fused and are not counted, so they are only applied when the state is read or switched."""
+        if len(self.amplitudes) < DENSE_FRACTION * 2 ** len(self.qubits):
+            return self
+        self.flush()
+        amplitudes = np.zeros(2 ** len(self.qubits), dtype=np.complex128)
+        for index, amplitude in self.amplitudes.items():
+            amplitudes[index] = amplitude
+        return StateVectorSimulation(self.qubits, amplitudes.reshape((2,) * len(self.qubits)))
+
+    def separate(self, qubit):
+        """Removes a qubit that is not entangled with the others from the simulation and returns a simulation
+        of its own state, or returns None when the qubit is entangled."""
+        self.flush()
+        shift = len(self.qubits) - 1 - self.qubits.index(qubit)
+        bit = 1 << shift
+        probabilities = [0.0, 0.0]
+        coherence = 0
+        for index, amplitude in self.amplitudes.items():
+            probabilities[(index >> shift) & 1] += abs(amplitude) ** 2
+            if not index & bit:
+                coherence += amplitude * np.conj(self.amplitudes.get(index | bit, 0))
+        state = pure_qubit_state(probabilities[0], probabilities[1], coherence)
+        if state is None:
+            return None
+
+        rest = {}
+        for index, amplitude in self.amplitudes.items():
+            key = ((index >> (shift + 1)) << shift) | (index & (bit - 1))
+            rest[key] = rest.get(key, 0) + np.conj(state[(index >> shift) & 1]) * amplitude
+        norm = sum(abs(amplitude) ** 2 for amplitude in rest.values()) ** 0.5
+        self.qubits.remove(qubit)
+        self.amplitudes = {index: amplitude / norm for index, amplitude in rest.items() if abs(amplitude) > TOLERANCE}
+        return StateVectorSimulation([qubit], state)
+
+    def x_expectation(self, obj):
+        """Returns the expectation value of X on the object's qubit, which is negative for a |-> like phase."""
+        self.flush()
+        bit = 1 << (len(self.qubits) - 1 - self.qubits.index(obj.qubit))
+        total = 0
+        for index, amplitude in self.amplitudes.items():
+            if not index & bit:
+                total += amplitude * np.conj(self.amplitudes.get(index | bit, 0))
+        return 2 * float(np.real(total))
+
+    def distribution(self, objects):
+        """Returns the probability of every joint state of the given objects that can occur."""
+        self.flush()
+        shifts = [len(self.qubits) - 1 - self.qubits.index(obj.qubit) for obj in objects]
+        distribution = {}
+        for index, amplitude in self.amplitudes.items():
+            states = tuple((index >> shift) & 1 for shift in shifts)
+            distribution[states] = distribution.get(states, 0) + abs(amplitude) ** 2
+        return distribution
@@ -1,6 +1,10 @@
 import pygame
-from scripts.game_objects import QuantumObject, gates, gate_info_image, control_gates
-from scripts.common_functions import add_text, set_dragging
+from scripts.game_objects import QuantumObject, gates, gate_info_images, control_gates
+from scripts.assets import assets
+from scripts.game_state import apply_gate
+from scripts.common_functions import add_text, set_dragging, get_font
+
+SLOT_SPACING = 55  # Horizontal distance between the slots of the hotbar
 
 class ItemSlot(pygame.sprite.Sprite):
     """Represents a slot for an item in the hotbar."""
@@ -25,8 +29,8 @@ class ItemSlot(pygame.sprite.Sprite):
         self.dragging = False
 
         # Setup hover image for displaying additional item info
-        info_image = gate_info_image.get(item_name)
-        if info_image:
+        if item_name in gate_info_images:
+            info_image = assets.image(gate_info_images[item_name])
             rect = info_image.get_rect()
             hover_width = int(rect.width * 0.5)
             hover_height = int(rect.height * 0.5)
@@ -43,12 +47,12 @@ class ItemSlot(pygame.sprite.Sprite):
 
             self.hover_image_rect = self.hover_image.get_rect()
 
-    def hover(self, screen):
-        """Draws the hover image at the mouse position if the slot is not being dragged."""
+    def hover(self):
+        """Returns the hover image as an overlay at the mouse position if the slot is not being dragged."""
         if not self.dragging:
             mouse_x, mouse_y = pygame.mouse.get_pos()
             self.hover_image_rect.topleft = (mouse_x, mouse_y - 45)
-            screen.blit(self.hover_image, self.hover_image_rect)
+            return ('image', self.hover_image, self.hover_image_rect.copy())
 
 class Hotbar(pygame.sprite.Sprite):
     """ Represents the hotbar which holds item slots."""
@@ -62,7 +66,7 @@ class Hotbar(pygame.sprite.Sprite):
         self.rect.y = 525
         self.slots = {}
         self.sprites = pygame.sprite.Group()
-        self.font = pygame.font.Font(None, 24)
+        self.font = get_font()
     
     def change_item_text(self, slot, item, count=0):
         """Updates the text displayed on the item slot."""
@@ -79,7 +83,7 @@ class Hotbar(pygame.sprite.Sprite):
             self.change_item_text(slot, item, str(slot.count))
             return slot
         else:
-            new_slot = ItemSlot(self.rect.x + len(self.slots) * 55, self.rect.y, count, item)
+            new_slot = ItemSlot(self.rect.x + len(self.slots) * SLOT_SPACING, self.rect.y, count, item)
             self.change_item_text(new_slot, item, str(count))
             self.slots[item] = new_slot
             self.sprites.add(new_slot)
@@ -98,22 +102,40 @@ class Hotbar(pygame.sprite.Sprite):
             self.change_item_text(slot, key, str(slot.count))
 
     def remove_item(self, game, event, key):
-        """Removes an item from the hotbar and applies its effect to a game object if applicable."""
+        """Applies the item's gate to the game object it was dropped on if applicable, which removes it from the hotbar.
+        Control gates start dragging the object instead, until they are dropped on the object they control."""
         slot = self.slots.get(key)
         if not slot:
             return
 
-        for _, obj in game.objects.items():
-            if isinstance(obj, QuantumObject):
-                if obj.rect.collidepoint(event.pos) and game.player.distance(obj.position[0], obj.position[1]):
-                    if key in control_gates:
-                        set_dragging(obj, event)
-                        obj.control = key
-                        return
-                    else:
-                        obj.apply_effect(game, slot.effect)
-                    self.remove_by_key(key)
-                    break
+        obj = game.object_at(event.pos)
+        if isinstance(obj, QuantumObject) and game.player.distance(obj.position[0], obj.position[1]):
+            if key in control_gates:
+                set_dragging(obj, event)
+                obj.control = key
+                game.dragged_object = obj
+            else:
+                game.step(apply_gate(key, obj.position))
+
+    def slot_at(self, position):
+        """Returns the slot at a pixel position, looked up from its index in the hotbar."""
+        index = (position[0] - self.rect.x) // SLOT_SPACING
+        if 0 <= index < len(self.slots):
+            slot = list(self.slots.values())[index]
+            if slot.rect.collidepoint(position):
+                return slot
+
+    def hover(self):
+        """Returns the hover overlay of the slot under the mouse cursor, if any."""
+        slot = self.slot_at(pygame.mouse.get_pos())
+        overlay = slot.hover() if slot else None
+        return [overlay] if overlay else []
+
+    def handle_mouse_down(self, event):
+        """Starts dragging the slot that was clicked, if any."""
+        slot = self.slot_at(event.pos)
+        if slot:
+            set_dragging(slot, event)
 
     def handle_mouse_up(self):
         """Placeholder for handling mouse release events."""
@@ -122,4 +144,4 @@ class Hotbar(pygame.sprite.Sprite):
     def update_slots(self):
         """Updates the position of all item slots in the hotbar."""
         for i, (name, slot) in enumerate(self.slots.items()):
-            slot.rect.x = self.rect.x + i * 55
+            slot.rect.x = self.rect.x + i * SLOT_SPACING
@@ -0,0 +1,141 @@
+import cirq
+import numpy as np
+import pytest
+from scripts.state_vector_simulation import StateVectorSimulation, SparseSimulation
+from scripts.stabilizer_simulation import StabilizerSimulation
+
+BACKENDS = [StateVectorSimulation, SparseSimulation, StabilizerSimulation]
+SEEDS = range(20)
+ATOL = 1e-7
+
+CLIFFORD_GATES = [cirq.X, cirq.Y, cirq.Z, cirq.H, cirq.S, cirq.S ** -1, cirq.CNOT, cirq.CZ]
+NON_CLIFFORD_GATES = [cirq.T, cirq.ry(0.7), cirq.ControlledGate(cirq.H)]
+
+class Pillar:
+    """Stands in for a quantum object, which simulations only read the qubit of."""
+    def __init__(self, qubit):
+        """Initializes the object with its qubit."""
+        self.qubit = qubit
+
+def random_operations(rng, qubits, count, clifford=True):
+    """Returns random operations on the qubits, only Clifford gates unless asked otherwise."""
+    gates = CLIFFORD_GATES if clifford else CLIFFORD_GATES + NON_CLIFFORD_GATES
+    operations = []
+    for _ in range(count):
+        gate = gates[rng.integers(len(gates))]
+        if gate.num_qubits() > len(qubits):
+            continue
+        targets = rng.choice(len(qubits), gate.num_qubits(), replace=False)
+        operations.append(gate.on(*[qubits[target] for target in targets]))
+    return operations
+
+def apply(simulation, operations):
+    """Applies operations one at a time, switching simulations like the quantum engine does."""
+    for operation in operations:
+        simulation = simulation.writable()
+        if not simulation.supports([operation]):
+            simulation = simulation.to_state_vector()
+        simulation.add_operations([operation])
+        simulation = simulation.compact()
+    return simulation
+
+def simulate(backend, qubits, operations):
+    """Returns a new simulation of the qubits after applying the operations."""
+    return apply(backend(qubits), operations)
+
+def final_state_vector(operations, qubits):
+    """Returns the state vector cirq simulates for the operations, in double precision."""
+    return cirq.final_state_vector(cirq.Circuit(operations), qubit_order=qubits, dtype=np.complex128)
+
+def state_vector(simulation):
+    """Returns the dense state vector of any simulation, with the first qubit as the most significant bit."""
+    vector = np.zeros(2 ** len(simulation.qubits), dtype=np.complex128)
+    for index, amplitude in simulation.to_state_vector().sparse_amplitudes().items():
+        vector[index] = amplitude
+    return vector
+
+def expected_distribution(vector, qubits, subset):
+    """Returns the joint distribution of a subset of qubits, in the given order, from a state vector."""
+    probabilities = (np.abs(vector) ** 2).reshape((2,) * len(qubits))
+    axes = [qubits.index(qubit) for qubit in subset]
+    other_axes = tuple(axis for axis in range(len(qubits)) if axis not in axes)
+    table = np.transpose(probabilities.sum(axis=other_axes), np.argsort(np.argsort(axes)))
+    return {states: float(table[states]) for states in np.ndindex(table.shape)}
+
+def expected_x(vector, qubits, qubit):
+    """Returns the expectation value of X on a qubit from a state vector."""
+    amplitudes = np.moveaxis(vector.reshape((2,) * len(qubits)), qubits.index(qubit), 0).reshape(2, -1)
+    return 2 * float(np.real(np.vdot(amplitudes[1], amplitudes[0])))
+
+def assert_matches(simulation, vector, qubits, rng):
+    """Checks the marginals, a random joint distribution and X expectations of a simulation against a state vector."""
+    assert list(simulation.qubits) == list(qubits)
+    assert cirq.allclose_up_to_global_phase(state_vector(simulation), vector, atol=ATOL)
+
+    for qubit in qubits:
+        expected = expected_distribution(vector, qubits, [qubit])
+        actual = simulation.distribution([Pillar(qubit)])
+        for states, probability in expected.items():
+            assert actual.get(states, 0.0) == pytest.approx(probability, abs=ATOL)
+        assert simulation.x_expectation(Pillar(qubit)) == pytest.approx(expected_x(vector, qubits, qubit), abs=ATOL)
+
+    subset = [qubits[index] for index in rng.permutation(len(qubits))[:rng.integers(1, len(qubits) + 1)]]
+    expected = expected_distribution(vector, qubits, subset)
+    actual = simulation.distribution([Pillar(qubit) for qubit in subset])
+    assert all(probability > 0 for probability in actual.values())
+    for states, probability in expected.items():
+        assert actual.get(states, 0.0) == pytest.approx(probability, abs=ATOL)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_random_circuits(backend, seed):
+    """Every backend reads the same state as cirq after random gates, non-Clifford ones included."""
+    rng = np.random.default_rng(seed)
+    qubits = cirq.LineQubit.range(rng.integers(1, 6))
+    operations = random_operations(rng, qubits, 12, clifford=seed % 2 == 0)
+    simulation = simulate(backend, qubits, operations)
+    assert_matches(simulation, final_state_vector(operations, qubits), qubits, rng)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_merge_and_split(backend, seed):
+    """Merged groups hold the tensor product of their states, and an unentangled qubit splits off unchanged."""
+    rng = np.random.default_rng(seed)
+    qubits = cirq.LineQubit.range(rng.integers(2, 6))
+    single = qubits[-1]
+    operations = random_operations(rng, qubits[:-1], 8, clifford=seed % 2 == 0)
+    single_operations = random_operations(rng, [single], 3)
+
+    simulation = simulate(backend, qubits[:-1], operations).merge(simulate(backend, [single], single_operations)).compact()
+    assert_matches(simulation, final_state_vector(operations + single_operations, qubits), qubits, rng)
+
+    separated = simulation.separate(single)
+    assert separated is not None
+    assert cirq.allclose_up_to_global_phase(state_vector(separated), final_state_vector(single_operations, [single]), atol=ATOL)
+    assert_matches(simulation, final_state_vector(operations, qubits[:-1]), qubits[:-1], rng)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_entangled_qubit_does_not_split(backend):
+    """A qubit of a Bell pair cannot be separated, and the pair is left as it was."""
+    qubits = cirq.LineQubit.range(2)
+    operations = [cirq.H(qubits[0]), cirq.CNOT(*qubits)]
+    simulation = simulate(backend, qubits, operations)
+    assert simulation.separate(qubits[1]) is None
+    assert_matches(simulation, final_state_vector(operations, qubits), qubits, np.random.default_rng(0))
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_copy_on_write(backend, seed):
+    """Gates applied after a simulation is shared change a copy, and leave the shared simulation as it was."""
+    rng = np.random.default_rng(seed)
+    qubits = cirq.LineQubit.range(rng.integers(1, 5))
+    operations = random_operations(rng, qubits, 8, clifford=seed % 2 == 0)
+    later_operations = random_operations(rng, qubits, 8)
+
+    simulation = simulate(backend, qubits, operations)
+    simulation.shared = True
+    changed = apply(simulation, later_operations)
+    if later_operations:
+        assert changed is not simulation
+    assert_matches(simulation, final_state_vector(operations, qubits), qubits, rng)
+    assert_matches(changed, final_state_vector(operations + later_operations, qubits), qubits, rng)